@@ -1,5 +1,17 @@
-import csv
+import argparse
+import functools
+import json
+import multiprocessing
+import os
+import statistics
 import sys
+import time
+import tracemalloc
+from collections import deque
+
+from graph import SNAPSHOT_DIR, MoviesView, NamesView, PeopleView, load_graph, source_stamp
+from ingest import Ingest
+from nameindex import NameIndex
 
 #from util import Node, StackFrontier, QueueFrontier
 
@@ -32,6 +44,31 @@ class QueueFrontier():
             self.frontier = self.frontier[1:]
             return node
 
+class DequeFrontier():
+    #Drop-in replacement for QueueFrontier: a deque gives O(1) add/remove and the states set gives O(1) contains_state.
+
+    def __init__(self):
+        self.frontier = deque()
+        self.states = set()
+
+    def add(self, node):
+        self.frontier.append(node)
+        self.states.add(node.state)
+
+    def contains_state(self, state):
+        return state in self.states
+
+    def empty(self):
+        return len(self.frontier) == 0
+
+    def remove(self):
+        if self.empty():
+            raise Exception("empty frontier")
+        else:
+            node = self.frontier.popleft()
+            self.states.discard(node.state)
+            return node
+
 # Maps names to a set of corresponding person_ids
 names = {}
 
@@ -41,55 +78,311 @@ people = {}
 # Maps movie_ids to a dictionary of: title, year, stars (a set of person_ids)
 movies = {}
 
+# CompactGraph backing the maps above when loaded with the "compact" backend
+graph = None
+
+# NameIndex over `names`, set by load_data when asked to index names
+name_index = None
+
+# Name index file kept in the snapshot directory
+NAME_INDEX_FILE = "names.pickle"
 
-def load_data(directory):
+# Storage engines accepted by load_data
+BACKENDS = ("dict", "compact")
+
+# How many neighbors_for_person results the compact backend keeps cached
+NEIGHBOR_CACHE_SIZE = 4096
+
+
+def load_data(directory, backend="dict", snapshot=True, costars=False, ingest=None,
+              index_names=False):
     """
     Load data from CSV files into memory.
+
+    The files are streamed through `ingest` (an Ingest of `directory` by
+    default), which counts dropped rows and can restrict loading to a
+    subset. With the "compact" backend, ids are interned into a
+    CompactGraph and `people`, `movies` and `names` become read-only
+    views over it. The graph is cached as a binary snapshot next to the
+    CSVs unless `snapshot` is False, and `costars` precomputes its
+    co-star index. `index_names` also loads the NameIndex for fuzzy
+    lookups (see load_name_index).
     """
-    # Load people
-    with open(f"{directory}/people.csv", encoding="utf-8") as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            people[row["id"]] = {
-                "name": row["name"],
-                "birth": row["birth"],
-                "movies": set()
-            }
-            if row["name"].lower() not in names:
-                names[row["name"].lower()] = {row["id"]}
-            else:
-                names[row["name"].lower()].add(row["id"])
+    global names, people, movies, graph, name_index
+    if backend not in BACKENDS:
+        raise ValueError(f"unknown backend {backend!r}")
+
+    ingest = ingest or Ingest(directory)
+    names, people, movies, graph, name_index = {}, {}, {}, None, None
+    cached_neighbors.cache_clear()
+    if backend == "compact":
+        graph = load_graph(directory, snapshot, costars, ingest)
+        names, people, movies = NamesView(graph), PeopleView(graph), MoviesView(graph)
+        if index_names:
+            name_index = load_name_index(directory, snapshot, ingest)
+        return
 
     # Load movies
-    with open(f"{directory}/movies.csv", encoding="utf-8") as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            movies[row["id"]] = {
-                "title": row["title"],
-                "year": row["year"],
-                "stars": set()
-            }
+    for movie_id, title, year in ingest.movies():
+        movies[movie_id] = {
+            "title": title,
+            "year": year,
+            "stars": set()
+        }
+
+    # Load people (only those starring in a loaded movie for a subset)
+    cast = None if ingest.min_year is None else ingest.cast(movies)
+    for person_id, name, birth in ingest.people(cast):
+        people[person_id] = {
+            "name": name,
+            "birth": birth,
+            "movies": set()
+        }
+        if name.lower() not in names:
+            names[name.lower()] = {person_id}
+        else:
+            names[name.lower()].add(person_id)
 
     # Load stars
-    with open(f"{directory}/stars.csv", encoding="utf-8") as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            try:
-                people[row["person_id"]]["movies"].add(row["movie_id"])
-                movies[row["movie_id"]]["stars"].add(row["person_id"])
-            except KeyError:
-                pass
+    for person_id, movie_id in ingest.stars(movies, people):
+        people[person_id]["movies"].add(movie_id)
+        movies[movie_id]["stars"].add(person_id)
 
+    if index_names:
+        name_index = load_name_index(directory, snapshot, ingest)
 
-def main():
-    if len(sys.argv) > 2:
-        sys.exit("Usage: python degrees.py [directory]")
-    directory = sys.argv[1] if len(sys.argv) == 2 else "large"
 
-    # Load data from files into memory
-    print("Loading data...")
-    load_data(directory)
-    print("Data loaded.")
+def load_name_index(directory, snapshot=True, ingest=None):
+    """
+    Returns a NameIndex over the loaded `names`.
+
+    With `snapshot`, the index is read from the directory's snapshot
+    directory when it matches the CSV files and `ingest` options, and
+    otherwise built and saved there, since building it for millions of
+    names takes far longer than loading it.
+    """
+    if not snapshot:
+        return NameIndex(names)
+
+    ingest = ingest or Ingest(directory)
+    path = os.path.join(directory, SNAPSHOT_DIR, NAME_INDEX_FILE)
+    stamp = source_stamp(directory, ingest.options())
+    index = NameIndex.load(path, stamp)
+    if index is None:
+        index = NameIndex(names)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            index.save(path, stamp)
+        except OSError:
+            # A read-only dataset directory just means no caching
+            pass
+    return index
+
+
+def compare_backends(directory):
+    """
+    Load `directory` with every backend and print load time and
+    retained memory side by side.
+    """
+    global names, people, movies, graph
+    runs = [(backend, backend, False) for backend in BACKENDS]
+    runs.append(("snapshot", "compact", True))
+
+    print(f"{'backend':<10}{'load time (s)':>16}{'memory (MiB)':>16}")
+    for label, backend, snapshot in runs:
+
+        # Make sure a fresh snapshot exists before timing loads from it
+        if snapshot:
+            load_data(directory, backend, snapshot)
+
+        # Time an untraced load, since tracemalloc slows allocation down
+        start = time.perf_counter()
+        load_data(directory, backend, snapshot)
+        elapsed = time.perf_counter() - start
+        names, people, movies, graph = {}, {}, {}, None
+
+        # Measure what the loaded structures keep alive (mapped snapshot
+        # arrays live in the page cache and are not counted)
+        tracemalloc.start()
+        load_data(directory, backend, snapshot)
+        size, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(f"{label:<10}{elapsed:>16.3f}{size / 2 ** 20:>16.1f}")
+
+
+def run_batch(lines, search, out=sys.stdout, fuzzy=False):
+    """
+    Answer one query per line of `lines`, each "source<TAB>target" where
+    both are names or person ids, streaming one JSON object per query to
+    `out`. With `fuzzy`, unknown names resolve to their best fuzzy match.
+    Returns the latency of every answered query in seconds.
+    """
+    latencies = []
+    for line in lines:
+        line = line.rstrip("\n")
+        if not line.strip():
+            continue
+
+        start = time.perf_counter()
+        result = answer_query(line, search, fuzzy)
+        elapsed = time.perf_counter() - start
+        if "error" not in result:
+            latencies.append(elapsed)
+
+        result["ms"] = round(elapsed * 1000, 3)
+        out.write(json.dumps(result) + "\n")
+        out.flush()
+    return latencies
+
+
+def answer_query(line, search, fuzzy=False):
+    """
+    Returns a JSON-ready dict answering the query on `line`, or holding
+    an "error" message if it cannot be answered.
+    """
+    fields = line.split("\t")
+    if len(fields) != 2:
+        return {"query": line, "error": "expected source<TAB>target"}
+
+    ids = []
+    for field in fields:
+        candidates = person_ids_for_query(field.strip(), fuzzy)
+        if len(candidates) > 1:
+            return {"query": line, "error": "ambiguous name", "name": field,
+                    "candidates": candidates}
+        if not candidates:
+            suggestions = [
+                {"person_id": person_id, "name": name, "score": round(score, 3)}
+                for score, person_id, name in lookup_people(field, limit=5)
+            ]
+            return {"query": line, "error": "person not found", "name": field,
+                    "suggestions": suggestions}
+        ids.append(candidates[0])
+
+    source, target = ids
+    path = search(source, target)
+    return {
+        "source": source,
+        "target": target,
+        "degrees": None if path is None else len(path),
+        "path": None if path is None else [
+            {"movie_id": movie_id, "person_id": person_id}
+            for movie_id, person_id in path
+        ]
+    }
+
+
+def person_ids_for_query(query, fuzzy=False):
+    """
+    Returns the sorted person_ids a batch query field may refer to:
+    the field itself if it is a known person_id, else every person
+    with that name, else (with `fuzzy`) the single best fuzzy match.
+    Never prompts.
+    """
+    if query in people:
+        return [query]
+    person_ids = sorted(names.get(query.lower(), ()))
+    if person_ids or not fuzzy:
+        return person_ids
+
+    candidates = lookup_people(query, limit=2)
+    if len(candidates) == 1 or (candidates and candidates[0][0] > candidates[1][0]):
+        return [candidates[0][1]]
+    return []
+
+
+def lookup_people(query, limit=10):
+    """
+    Returns up to `limit` (score, person_id, name) candidates for a
+    possibly partial or misspelled name, best first, from the name
+    index loaded by load_data.
+    """
+    if name_index is None:
+        raise RuntimeError("names were not indexed; load_data(..., index_names=True)")
+
+    candidates = []
+    for score, _, person_ids in name_index.lookup(query, limit):
+        for person_id in person_ids:
+            candidates.append((score, person_id, people[person_id]["name"]))
+    return candidates[:limit]
+
+
+def latency_summary(latencies):
+    """
+    Returns count, mean and percentile latencies (in milliseconds)
+    for a list of per-query latencies in seconds.
+    """
+    if not latencies:
+        return {"queries": 0}
+    ordered = sorted(latencies)
+
+    def percentile(p):
+        return round(ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))] * 1000, 3)
+
+    return {
+        "queries": len(ordered),
+        "mean_ms": round(statistics.fmean(ordered) * 1000, 3),
+        "p50_ms": percentile(50),
+        "p95_ms": percentile(95),
+        "p99_ms": percentile(99),
+        "max_ms": round(ordered[-1] * 1000, 3)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Find the degrees of separation between two people."
+    )
+    parser.add_argument("directory", nargs="?", default="large")
+    parser.add_argument("--backend", choices=BACKENDS, default="dict",
+                        help="storage engine for the loaded data")
+    parser.add_argument("--no-snapshot", dest="snapshot", action="store_false",
+                        help="always parse the CSVs instead of using a snapshot")
+    parser.add_argument("--costar-index", dest="costars", action="store_true",
+                        help="precompute deduplicated co-stars (compact backend)")
+    parser.add_argument("--min-year", type=int,
+                        help="only load movies released this year or later")
+    parser.add_argument("--progress", action="store_true",
+                        help="report loading throughput and dropped rows")
+    parser.add_argument("--log-dropped", action="store_true",
+                        help="print every dropped CSV row")
+    parser.add_argument("--fuzzy", action="store_true",
+                        help="in batch mode, resolve unknown names to their best fuzzy match")
+    parser.add_argument("--search", choices=SEARCHES, default="bfs",
+                        help="search strategy for the shortest path")
+    parser.add_argument("--compare-backends", action="store_true",
+                        help="report load time and memory of every backend")
+    parser.add_argument("--batch", metavar="FILE", nargs="?", const="-",
+                        help="answer source<TAB>target lines from FILE "
+                             "(default stdin) as JSON lines")
+    args = parser.parse_args()
+
+    if args.compare_backends:
+        compare_backends(args.directory)
+        return
+
+    # Load data from files into memory (status goes to stderr in batch mode
+    # so stdout carries only results)
+    status = sys.stderr if args.batch else sys.stdout
+    ingest = Ingest(args.directory, args.min_year,
+                    progress=status if args.progress else None,
+                    log=status if args.log_dropped else None)
+    print("Loading data...", file=status)
+    load_data(args.directory, args.backend, args.snapshot, args.costars, ingest,
+              index_names=bool(args.batch))
+    if args.progress:
+        print(ingest.summary(), file=status)
+    print("Data loaded.", file=status)
+
+    if args.batch:
+        search = SEARCHES[args.search]
+        if args.batch == "-":
+            latencies = run_batch(sys.stdin, search, fuzzy=args.fuzzy)
+        else:
+            with open(args.batch, encoding="utf-8") as f:
+                latencies = run_batch(f, search, fuzzy=args.fuzzy)
+        print(json.dumps(latency_summary(latencies)), file=sys.stderr)
+        return
 
     source = person_id_for_name(input("Name: "))
     if source is None:
@@ -98,7 +391,7 @@ def main():
     if target is None:
         sys.exit("Person not found.")
 
-    path = shortest_path(source, target)
+    path = SEARCHES[args.search](source, target)
 
     if path is None:
         print("Not connected.")
@@ -113,18 +406,23 @@ def main():
             print(f"{i + 1}: {person1} and {person2} starred in {movie}")
 
 #My interpretation for the solution to this practice project
-def shortest_path(source, target):
+def shortest_path(source, target, stats=None):
     """
     Returns the shortest list of (movie_id, person_id) pairs
     that connect the source to the target.
 
-    If no possible path, returns None.
+    If no possible path, returns None. If a `stats` dict is given, the
+    number of people expanded and the peak frontier size are stored in
+    it as "expanded" and "frontier_peak".
     """
 
-    #Creates the starting node, makes the frontier, then adds the starting node to the frontier.
+    #Creates the starting node, makes the frontier, then adds the starting node to the frontier. Explored is per search.
     start = Node(state=source, parent=None, action=None)
-    frontier = QueueFrontier()
+    frontier = DequeFrontier()
     frontier.add(start)
+    explored = set()
+    stats = {} if stats is None else stats
+    stats.update(expanded=0, frontier_peak=1)
 
     #This will continuously run until either None is returned or the shortest list of (movie_id, person_id) is returned.
     while True:
@@ -138,28 +436,215 @@ def shortest_path(source, target):
 
         #If the matching ID is found, then the pairs leading up from it will be returned in order.
         if currentNode.state == target:
-            pair = []
-            while currentNode.parent is not None:
-                pair.append((currentNode.action, currentNode.state))
-                currentNode = currentNode.parent
-
-            pair.reverse()
-            return pair
+            return node_path(currentNode)
 
         #If match is not found, then the currentNode will be expanded on.
         else:
             explored.add(currentNode.state)
+            stats["expanded"] += 1
             neighbours = neighbors_for_person(currentNode.state)
 
             #Loops the neighbours set and makes sure that the ID has not been explored or is already in que before added.
             for neighbour in neighbours:
                 if neighbour[1] not in explored and not frontier.contains_state(neighbour[1]):
-                    frontier.add(Node(state=neighbour[1], parent=currentNode, action=neighbour[0]))
+                    child = Node(state=neighbour[1], parent=currentNode, action=neighbour[0])
+
+                    #This checks if what we just made is the target, and if it is, its path is returned without queueing the rest.
+                    if child.state == target:
+                        return node_path(child)
+                    frontier.add(child)
+
+            stats["frontier_peak"] = max(stats["frontier_peak"], len(frontier.frontier))
+
+
+def node_path(node):
+    """
+    Returns the list of (movie_id, person_id) pairs
+    leading from the search root to `node`.
+    """
+    pair = []
+    while node.parent is not None:
+        pair.append((node.action, node.state))
+        node = node.parent
+
+    pair.reverse()
+    return pair
+
+
+def bidirectional_shortest_path(source, target, stats=None):
+    """
+    Returns the shortest list of (movie_id, person_id) pairs
+    that connect the source to the target, searching breadth-first
+    from both ends and always expanding the smaller frontier.
+
+    If no possible path, returns None. A `stats` dict is filled in as
+    for shortest_path, counting both frontiers together.
+    """
+    stats = {} if stats is None else stats
+    stats.update(expanded=0, frontier_peak=2)
+    if source == target:
+        return []
+
+    # Each side maps every person it reached to the (movie_id, person_id)
+    # step leading back towards its own root.
+    forward = {source: None}
+    backward = {target: None}
+    forward_frontier = [source]
+    backward_frontier = [target]
+
+    while forward_frontier and backward_frontier:
+        if len(forward_frontier) <= len(backward_frontier):
+            forward_frontier, meeting = expand_layer(forward_frontier, forward, backward, stats)
+        else:
+            backward_frontier, meeting = expand_layer(backward_frontier, backward, forward, stats)
+        stats["frontier_peak"] = max(stats["frontier_peak"],
+                                     len(forward_frontier) + len(backward_frontier))
+
+        # The first meeting found is on a shortest path, since every person
+        # the other side reached before its current layer was fully expanded.
+        if meeting is not None:
+            return join_paths(forward, backward, meeting)
+
+    return None
+
+
+def expand_layer(frontier, parents, other, stats):
+    """
+    Expands one whole BFS layer, recording parents of newly reached people
+    and counting expansions in `stats`.
+
+    Returns the next layer and the first person also reached by `other`
+    (or None if the two searches have not met).
+    """
+    next_frontier = []
+    for person_id in frontier:
+        stats["expanded"] += 1
+        for movie_id, neighbor_id in neighbors_for_person(person_id):
+            if neighbor_id in parents:
+                continue
+            parents[neighbor_id] = (movie_id, person_id)
+            if neighbor_id in other:
+                return next_frontier, neighbor_id
+            next_frontier.append(neighbor_id)
+    return next_frontier, None
+
+
+def join_paths(forward, backward, meeting):
+    """
+    Joins the source -> meeting and meeting -> target halves of a
+    bidirectional search into one list of (movie_id, person_id) pairs.
+    """
+    path = path_from_parents(forward, meeting)
 
-                    #This checks if what we just added is the target, and if it is, it restarts the loop with this being the only one to check.
-                    if people[neighbour[1]] == target:
-                        frontier = frontier[-1]
-                        break
+    person_id = meeting
+    while backward[person_id] is not None:
+        movie_id, next_id = backward[person_id]
+        path.append((movie_id, next_id))
+        person_id = next_id
+
+    return path
+
+
+def single_source_paths(source):
+    """
+    Runs one breadth-first sweep from `source` over everyone reachable.
+
+    Returns (distances, parents): distances maps each reachable person_id
+    to its degrees of separation from the source, and parents maps it to
+    the (movie_id, person_id) step that first reached it (None for the
+    source). Use path_from_parents to recover the path to any of them.
+    """
+    distances = {source: 0}
+    parents = {source: None}
+    layer = [source]
+    depth = 0
+
+    while layer:
+        depth += 1
+        next_layer = []
+        for person_id in layer:
+            for movie_id, neighbor_id in neighbors_for_person(person_id):
+                if neighbor_id not in distances:
+                    distances[neighbor_id] = depth
+                    parents[neighbor_id] = (movie_id, person_id)
+                    next_layer.append(neighbor_id)
+        layer = next_layer
+
+    return distances, parents
+
+
+def path_from_parents(parents, target):
+    """
+    Returns the list of (movie_id, person_id) pairs leading from the root
+    of `parents` to `target`, or None if the target was not reached.
+    """
+    if target not in parents:
+        return None
+
+    path = []
+    person_id = target
+    while parents[person_id] is not None:
+        movie_id, previous_id = parents[person_id]
+        path.append((movie_id, person_id))
+        person_id = previous_id
+
+    path.reverse()
+    return path
+
+
+def parallel_distances(sources, directory, backend="compact", targets=None,
+                       processes=None):
+    """
+    Runs single_source_paths for every person in `sources` across a pool
+    of worker processes and returns {source: distances}.
+
+    Workers share one read-only copy of the data: forked workers inherit
+    what this process already loaded, and the compact backend's snapshot
+    is memory-mapped, so freshly started workers share its pages too.
+    If `targets` is given, each distances dict is restricted to it to
+    keep results small.
+    """
+    targets = None if targets is None else frozenset(targets)
+    sources = list(sources)
+    processes = processes or multiprocessing.cpu_count()
+    chunksize = max(1, len(sources) // (processes * 4))
+
+    with multiprocessing.Pool(processes, initializer=init_worker,
+                              initargs=(directory, backend)) as pool:
+        return dict(pool.imap_unordered(
+            distances_worker,
+            [(source, targets) for source in sources],
+            chunksize
+        ))
+
+
+def init_worker(directory, backend):
+    """
+    Pool initializer: loads the data unless it was inherited by fork.
+    """
+    if not people:
+        load_data(directory, backend)
+
+
+def distances_worker(job):
+    """
+    Pool task: returns (source, distances) for one source.
+    """
+    source, targets = job
+    distances, _ = single_source_paths(source)
+    if targets is not None:
+        distances = {
+            person_id: degrees for person_id, degrees in distances.items()
+            if person_id in targets
+        }
+    return source, distances
+
+
+# Search strategies selectable from the command line
+SEARCHES = {
+    "bfs": shortest_path,
+    "bidirectional": bidirectional_shortest_path
+}
 
 
 def person_id_for_name(name):
@@ -193,6 +678,9 @@ def neighbors_for_person(person_id):
     Returns (movie_id, person_id) pairs for people
     who starred with a given person.
     """
+    if graph is not None:
+        return cached_neighbors(person_id)
+
     movie_ids = people[person_id]["movies"]
     neighbors = set()
     for movie_id in movie_ids:
@@ -202,5 +690,14 @@ def neighbors_for_person(person_id):
     return neighbors
 
 
-main()
+@functools.lru_cache(maxsize=NEIGHBOR_CACHE_SIZE)
+def cached_neighbors(person_id):
+    """
+    Returns the compact graph's neighbors of a person as a frozenset,
+    keeping recent results so hub actors are only expanded once.
+    """
+    return frozenset(graph.neighbors(person_id))
+
 
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+import argparse
+import csv
+import itertools
+import random
+import statistics
+import tempfile
+import time
+import tracemalloc
+
+import Degrees
+
+
+def generate_dataset(directory, people=10000, movies=3000, cast=6, skew=1.0, seed=0):
+    """
+    Write a synthetic people/movies/stars dataset to `directory`.
+
+    Each movie gets a cast of about `cast` people (at least two). People
+    are chosen with probability proportional to 1 / rank ** `skew`, so
+    skew 0 spreads roles uniformly and larger values concentrate them on
+    a few hub actors, like real filmographies.
+    """
+    rng = random.Random(seed)
+    cum_weights = list(itertools.accumulate(
+        1 / rank ** skew for rank in range(1, people + 1)
+    ))
+    person_ids = list(range(people))
+    rng.shuffle(person_ids)
+
+    with open(f"{directory}/people.csv", "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["id", "name", "birth"])
+        for person_id in range(people):
+            writer.writerow([person_id, f"Person {person_id}", rng.randint(1920, 2005)])
+
+    with open(f"{directory}/movies.csv", "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["id", "title", "year"])
+        for movie_id in range(movies):
+            writer.writerow([movie_id, f"Movie {movie_id}", rng.randint(1930, 2020)])
+
+    with open(f"{directory}/stars.csv", "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["person_id", "movie_id"])
+        for movie_id in range(movies):
+            size = max(2, round(rng.expovariate(1 / cast)))
+            for rank in rng.choices(range(people), cum_weights=cum_weights, k=size):
+                writer.writerow([person_ids[rank], movie_id])
+
+
+def run_benchmark(searches, pairs=100, seed=0):
+    """
+    Run every search in `searches` (name -> function) over the same
+    random pairs of the currently loaded people who starred in a movie.
+
+    Returns {name: summary} with wall time, people expanded and frontier
+    peak statistics, the most memory any one search allocated at once,
+    plus the number of pairs whose path length disagreed with the first
+    search.
+    """
+    rng = random.Random(seed)
+    cast = sorted(person_id for person_id in Degrees.people
+                  if Degrees.people[person_id]["movies"])
+    queries = [tuple(rng.sample(cast, 2)) for _ in range(pairs)]
+
+    results = {}
+    reference = None
+    for name, search in searches.items():
+        times, expanded, peaks, lengths = [], [], [], []
+        for source, target in queries:
+            stats = {}
+            start = time.perf_counter()
+            path = search(source, target, stats=stats)
+            times.append(time.perf_counter() - start)
+            expanded.append(stats["expanded"])
+            peaks.append(stats["frontier_peak"])
+            lengths.append(None if path is None else len(path))
+
+        # Trace allocations in a second, untimed pass, since tracemalloc
+        # slows allocation down
+        peak_bytes = 0
+        tracemalloc.start()
+        for source, target in queries:
+            before, _ = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+            search(source, target, stats={})
+            _, peak = tracemalloc.get_traced_memory()
+            peak_bytes = max(peak_bytes, peak - before)
+        tracemalloc.stop()
+
+        if reference is None:
+            reference = lengths
+        results[name] = {
+            "mean_ms": statistics.fmean(times) * 1000,
+            "max_ms": max(times) * 1000,
+            "mean_expanded": statistics.fmean(expanded),
+            "max_expanded": max(expanded),
+            "max_frontier": max(peaks),
+            "peak_mib": peak_bytes / 2 ** 20,
+            "mismatches": sum(a != b for a, b in zip(lengths, reference))
+        }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark Degrees searches on a synthetic or existing dataset."
+    )
+    parser.add_argument("--directory", help="benchmark this dataset instead of generating one")
+    parser.add_argument("--people", type=int, default=10000)
+    parser.add_argument("--movies", type=int, default=3000)
+    parser.add_argument("--cast", type=float, default=6, help="mean cast size per movie")
+    parser.add_argument("--skew", type=float, default=1.0, help="power-law exponent of roles per person")
+    parser.add_argument("--pairs", type=int, default=100)
+    parser.add_argument("--backend", choices=Degrees.BACKENDS, default="dict")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as scratch:
+        directory = args.directory
+        if directory is None:
+            directory = scratch
+            generate_dataset(directory, args.people, args.movies, args.cast, args.skew, args.seed)
+
+        start = time.perf_counter()
+        Degrees.load_data(directory, args.backend)
+        print(f"Loaded {len(Degrees.people):,} people and {len(Degrees.movies):,} movies "
+              f"in {time.perf_counter() - start:.2f}s ({args.backend} backend)")
+
+        results = run_benchmark(Degrees.SEARCHES, args.pairs, args.seed)
+
+    print(f"{'search':<15}{'mean ms':>10}{'max ms':>10}{'mean exp':>12}{'max exp':>10}"
+          f"{'max front':>11}{'peak MiB':>10}{'mismatch':>10}")
+    for name, result in results.items():
+        print(f"{name:<15}{result['mean_ms']:>10.2f}{result['max_ms']:>10.2f}"
+              f"{result['mean_expanded']:>12.1f}{result['max_expanded']:>10}"
+              f"{result['max_frontier']:>11}{result['peak_mib']:>10.2f}"
+              f"{result['mismatches']:>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,419 @@
+import json
+import mmap
+import os
+import pickle
+import sys
+from array import array
+from collections.abc import Mapping
+
+from ingest import Ingest
+
+# Typecode for every offset and index array (signed 64-bit)
+INDEX_TYPE = "q"
+
+# Snapshots live in this subdirectory of the dataset directory. Bump the
+# version whenever the layout below changes so old snapshots are rebuilt.
+SNAPSHOT_DIR = ".degrees-snapshot"
+SNAPSHOT_VERSION = 3
+
+# CSV files a snapshot is derived from
+SOURCES = ("people.csv", "movies.csv", "stars.csv")
+
+# Attributes stored as raw memory-mappable arrays (the co-star index ones
+# only once built), and the rest (ids, names and lookup dicts) stored
+# together in one pickle
+ARRAYS = ("person_offsets", "person_movies", "movie_offsets", "movie_stars",
+          "costar_offsets", "costar_people", "costar_movies")
+STRINGS = ("person_ids", "movie_ids", "person_index", "movie_index",
+           "person_names", "person_births", "movie_titles", "movie_years",
+           "name_index")
+
+
+class CompactGraph():
+    """
+    Bipartite person/movie star graph.
+
+    IMDb ids are interned to dense integers (their position in
+    `person_ids` / `movie_ids`) and adjacency is stored CSR-style: the
+    movies of person p are
+    `person_movies[person_offsets[p]:person_offsets[p + 1]]`, and the
+    stars of movie m are
+    `movie_stars[movie_offsets[m]:movie_offsets[m + 1]]`.
+    """
+
+    def __init__(self):
+        # Dense id -> IMDb id, and IMDb id -> dense id
+        self.person_ids = []
+        self.movie_ids = []
+        self.person_index = {}
+        self.movie_index = {}
+
+        # Attributes indexed by dense id
+        self.person_names = []
+        self.person_births = []
+        self.movie_titles = []
+        self.movie_years = []
+
+        # Maps lowercase names to a tuple of dense person ids
+        self.name_index = {}
+
+        # CSR adjacency in both directions
+        self.person_offsets = array(INDEX_TYPE, [0])
+        self.person_movies = array(INDEX_TYPE)
+        self.movie_offsets = array(INDEX_TYPE, [0])
+        self.movie_stars = array(INDEX_TYPE)
+
+        # Optional co-star index (see build_costar_index)
+        self.costar_offsets = None
+        self.costar_people = None
+        self.costar_movies = None
+
+        # Rows dropped while loading the CSVs, by reason, so a graph
+        # loaded from a snapshot can still report them
+        self.dropped = {}
+
+    @classmethod
+    def from_csv(cls, directory, ingest=None):
+        """
+        Build a graph from the people, movies and stars CSV files,
+        streamed through `ingest` (an Ingest of `directory` by default).
+        """
+        ingest = ingest or Ingest(directory)
+        graph = cls()
+        names = {}
+
+        # Load movies
+        for movie_id, title, year in ingest.movies():
+            m = graph.movie_index.get(movie_id)
+            if m is None:
+                m = len(graph.movie_ids)
+                graph.movie_index[movie_id] = m
+                graph.movie_ids.append(movie_id)
+                graph.movie_titles.append(title)
+                graph.movie_years.append(year)
+            else:
+                graph.movie_titles[m] = title
+                graph.movie_years[m] = year
+
+        # Load people, only those starring in a loaded movie for a subset
+        cast = None if ingest.min_year is None else ingest.cast(graph.movie_index)
+        for person_id, name, birth in ingest.people(cast):
+            p = graph.person_index.get(person_id)
+            if p is None:
+                p = len(graph.person_ids)
+                graph.person_index[person_id] = p
+                graph.person_ids.append(person_id)
+                graph.person_names.append(name)
+                graph.person_births.append(birth)
+            else:
+                graph.person_names[p] = name
+                graph.person_births[p] = birth
+            names.setdefault(name.lower(), set()).add(p)
+
+        # Load stars as two parallel edge arrays
+        edge_people = array(INDEX_TYPE)
+        edge_movies = array(INDEX_TYPE)
+        for person_id, movie_id in ingest.stars(graph.movie_index, graph.person_index):
+            edge_people.append(graph.person_index[person_id])
+            edge_movies.append(graph.movie_index[movie_id])
+
+        graph.name_index = {
+            name: tuple(sorted(ids)) for name, ids in names.items()
+        }
+        graph.dropped = dict(ingest.dropped)
+        graph.person_offsets, graph.person_movies = build_csr(
+            edge_people, edge_movies, len(graph.person_ids)
+        )
+        graph.movie_offsets, graph.movie_stars = build_csr(
+            edge_movies, edge_people, len(graph.movie_ids)
+        )
+        return graph
+
+    def save(self, path, stamp):
+        """
+        Write the graph as a snapshot in directory `path`, tagged with the
+        source `stamp` it was built from.
+        """
+        os.makedirs(path, exist_ok=True)
+
+        # Drop the metadata first so a half-written snapshot is never valid
+        meta_path = os.path.join(path, "meta.json")
+        if os.path.exists(meta_path):
+            os.remove(meta_path)
+
+        # Files are replaced rather than rewritten in place, since this
+        # graph may itself be memory-mapped from them
+        arrays = [name for name in ARRAYS if getattr(self, name) is not None]
+        for name in arrays:
+            filename = os.path.join(path, f"{name}.bin")
+            with open(filename + ".tmp", "wb") as f:
+                f.write(getattr(self, name))
+            os.replace(filename + ".tmp", filename)
+        filename = os.path.join(path, "strings.pickle")
+        with open(filename + ".tmp", "wb") as f:
+            pickle.dump({name: getattr(self, name) for name in STRINGS}, f,
+                        protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(filename + ".tmp", filename)
+
+        meta = {
+            "version": SNAPSHOT_VERSION,
+            "byteorder": sys.byteorder,
+            "sources": stamp,
+            "arrays": arrays,
+            "dropped": self.dropped
+        }
+        with open(meta_path + ".tmp", "w") as f:
+            json.dump(meta, f)
+        os.replace(meta_path + ".tmp", meta_path)
+
+    @classmethod
+    def load(cls, path, stamp):
+        """
+        Load a snapshot written by `save`, memory-mapping its arrays.
+
+        Returns None if there is no snapshot, or if it is stale, from
+        another version, or unreadable.
+        """
+        try:
+            with open(os.path.join(path, "meta.json")) as f:
+                meta = json.load(f)
+            if (meta["version"] != SNAPSHOT_VERSION
+                    or meta["byteorder"] != sys.byteorder
+                    or meta["sources"] != stamp):
+                return None
+
+            graph = cls()
+            graph.dropped = meta["dropped"]
+            for name in meta["arrays"]:
+                setattr(graph, name, map_array(os.path.join(path, f"{name}.bin")))
+            with open(os.path.join(path, "strings.pickle"), "rb") as f:
+                strings = pickle.load(f)
+            for name in STRINGS:
+                setattr(graph, name, strings[name])
+        except (OSError, ValueError, KeyError, EOFError, pickle.UnpicklingError):
+            return None
+        return graph
+
+    def build_costar_index(self):
+        """
+        Precompute each person's deduplicated co-stars, excluding the
+        person themselves, with one connecting movie per co-star: the
+        co-stars of p are
+        `costar_people[costar_offsets[p]:costar_offsets[p + 1]]`, reached
+        through the movie at the same position in `costar_movies`.
+        """
+        offsets = array(INDEX_TYPE, [0])
+        people = array(INDEX_TYPE)
+        movies = array(INDEX_TYPE)
+        for p in range(len(self.person_ids)):
+            via = {}
+            for m, q in self.costars(p):
+                if q != p and q not in via:
+                    via[q] = m
+            for q in sorted(via):
+                people.append(q)
+                movies.append(via[q])
+            offsets.append(len(people))
+
+        self.costar_offsets = offsets
+        self.costar_people = people
+        self.costar_movies = movies
+
+    def movies_of(self, p):
+        """Returns the dense movie ids person `p` starred in."""
+        return self.person_movies[self.person_offsets[p]:self.person_offsets[p + 1]]
+
+    def stars_of(self, m):
+        """Returns the dense person ids that starred in movie `m`."""
+        return self.movie_stars[self.movie_offsets[m]:self.movie_offsets[m + 1]]
+
+    def costars(self, p):
+        """Yields dense (movie, person) pairs for everyone sharing a movie with `p`."""
+        for m in self.movies_of(p):
+            for q in self.stars_of(m):
+                yield m, q
+
+    def neighbors(self, person_id):
+        """
+        Returns (movie_id, person_id) pairs for people
+        who starred with a given person.
+
+        Once the co-star index is built, each co-star appears once (with
+        one shared movie) and the person themselves is left out.
+        """
+        movie_ids = self.movie_ids
+        person_ids = self.person_ids
+        if self.costar_offsets is not None:
+            p = self.person_index[person_id]
+            start, end = self.costar_offsets[p], self.costar_offsets[p + 1]
+            return {
+                (movie_ids[m], person_ids[q]) for m, q in
+                zip(self.costar_movies[start:end], self.costar_people[start:end])
+            }
+        return {
+            (movie_ids[m], person_ids[q])
+            for m, q in self.costars(self.person_index[person_id])
+        }
+
+
+def load_graph(directory, snapshot=True, costars=False, ingest=None):
+    """
+    Returns a CompactGraph for the CSV files in `directory`, with its
+    co-star index built if `costars` is set.
+
+    With `snapshot`, the graph is loaded from the directory's binary
+    snapshot when it matches the CSV files' size and mtime and the
+    `ingest` options; otherwise it is rebuilt from the CSVs and the
+    snapshot rewritten. A snapshot hit adds the rows dropped when it was
+    built to `ingest.dropped`, though they are not logged again.
+    """
+    ingest = ingest or Ingest(directory)
+    if not snapshot:
+        graph = CompactGraph.from_csv(directory, ingest)
+        if costars:
+            graph.build_costar_index()
+        return graph
+
+    path = os.path.join(directory, SNAPSHOT_DIR)
+    stamp = source_stamp(directory, ingest.options())
+    graph = CompactGraph.load(path, stamp)
+    changed = graph is None
+    if graph is None:
+        graph = CompactGraph.from_csv(directory, ingest)
+    else:
+        ingest.dropped.update(graph.dropped)
+    if costars and graph.costar_offsets is None:
+        graph.build_costar_index()
+        changed = True
+
+    if changed:
+        try:
+            graph.save(path, stamp)
+        except OSError:
+            # A read-only dataset directory just means no caching
+            pass
+    return graph
+
+
+def source_stamp(directory, options):
+    """
+    Returns [size, mtime_ns] of each source CSV, keyed by file name,
+    along with the ingest `options` the graph was loaded with.
+    """
+    stamp = {"options": options}
+    for filename in SOURCES:
+        stat = os.stat(os.path.join(directory, filename))
+        stamp[filename] = [stat.st_size, stat.st_mtime_ns]
+    return stamp
+
+
+def map_array(filename):
+    """
+    Memory-maps a file of INDEX_TYPE integers as a read-only memoryview.
+    """
+    with open(filename, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return array(INDEX_TYPE)
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    return memoryview(mapped).cast(INDEX_TYPE)
+
+
+def build_csr(rows, cols, n):
+    """
+    Groups parallel (row, col) arrays into CSR offset and index arrays
+    with `n` rows. Each row's indices are sorted and deduplicated.
+    """
+
+    # Counting sort of the pairs by row
+    offsets = array(INDEX_TYPE, [0]) * (n + 1)
+    for r in rows:
+        offsets[r + 1] += 1
+    for r in range(n):
+        offsets[r + 1] += offsets[r]
+    fill = offsets[:-1]
+    indices = array(INDEX_TYPE, [0]) * len(rows)
+    for r, c in zip(rows, cols):
+        indices[fill[r]] = c
+        fill[r] += 1
+
+    # Sort and deduplicate each row in place, compacting as we go
+    write = 0
+    for r in range(n):
+        row = sorted(set(indices[offsets[r]:offsets[r + 1]]))
+        offsets[r] = write
+        indices[write:write + len(row)] = array(INDEX_TYPE, row)
+        write += len(row)
+    offsets[n] = write
+    del indices[write:]
+
+    return offsets, indices
+
+
+class PeopleView(Mapping):
+    """
+    Read-only `people` mapping over a CompactGraph, shaped like the dict
+    backend: person_id -> {"name", "birth", "movies"}.
+    """
+
+    def __init__(self, graph):
+        self.graph = graph
+
+    def __getitem__(self, person_id):
+        graph = self.graph
+        p = graph.person_index[person_id]
+        return {
+            "name": graph.person_names[p],
+            "birth": graph.person_births[p],
+            "movies": {graph.movie_ids[m] for m in graph.movies_of(p)}
+        }
+
+    def __iter__(self):
+        return iter(self.graph.person_ids)
+
+    def __len__(self):
+        return len(self.graph.person_ids)
+
+
+class MoviesView(Mapping):
+    """
+    Read-only `movies` mapping over a CompactGraph, shaped like the dict
+    backend: movie_id -> {"title", "year", "stars"}.
+    """
+
+    def __init__(self, graph):
+        self.graph = graph
+
+    def __getitem__(self, movie_id):
+        graph = self.graph
+        m = graph.movie_index[movie_id]
+        return {
+            "title": graph.movie_titles[m],
+            "year": graph.movie_years[m],
+            "stars": {graph.person_ids[p] for p in graph.stars_of(m)}
+        }
+
+    def __iter__(self):
+        return iter(self.graph.movie_ids)
+
+    def __len__(self):
+        return len(self.graph.movie_ids)
+
+
+class NamesView(Mapping):
+    """
+    Read-only `names` mapping over a CompactGraph:
+    lowercase name -> set of person_ids.
+    """
+
+    def __init__(self, graph):
+        self.graph = graph
+
+    def __getitem__(self, name):
+        person_ids = self.graph.person_ids
+        return {person_ids[p] for p in self.graph.name_index[name]}
+
+    def __iter__(self):
+        return iter(self.graph.name_index)
+
+    def __len__(self):
+        return len(self.graph.name_index)
@@ -0,0 +1,138 @@
+import csv
+import time
+from collections import Counter
+
+# Rows between progress reports
+PROGRESS_EVERY = 250000
+
+
+class Ingest():
+    """
+    Streams the people, movies and stars CSVs of a dataset directory as
+    plain tuples, using positional csv.reader rows instead of a dict per
+    row.
+
+    Rows that cannot be used are dropped and counted in `dropped` by
+    reason ("malformed", "dangling_person", "dangling_movie", "filtered"),
+    and each is written to `log` if one is given. `min_year` loads only
+    movies released that year or later, the stars of those movies, and
+    the people among those stars. Progress and throughput go to
+    `progress` if given.
+    """
+
+    def __init__(self, directory, min_year=None, progress=None, log=None):
+        self.directory = directory
+        self.min_year = min_year
+        self.progress = progress
+        self.log = log
+        self.dropped = Counter()
+
+    def options(self):
+        """Returns the options that change what gets loaded."""
+        return {"min_year": self.min_year}
+
+    def movies(self):
+        """
+        Yields (movie_id, title, year) for every movie kept.
+        """
+        for movie_id, title, year in self.rows("movies.csv", ("id", "title", "year")):
+            if self.min_year is not None and not released_since(year, self.min_year):
+                self.drop("filtered", "movies.csv", movie_id)
+                continue
+            yield movie_id, title, year
+
+    def cast(self, movie_ids):
+        """
+        Returns the set of person_ids starring in any of `movie_ids`,
+        without counting or logging drops (the stars are read again by
+        `stars`).
+        """
+        return {
+            person_id
+            for person_id, movie_id in self.rows("stars.csv", ("person_id", "movie_id"), quiet=True)
+            if movie_id in movie_ids
+        }
+
+    def stars(self, movie_ids, person_ids):
+        """
+        Yields (person_id, movie_id) for every star linking a person in
+        `person_ids` to a movie in `movie_ids`. Stars of unknown movies are
+        dropped, as filtered if `min_year` is set (the movie may just be
+        too old) and dangling otherwise.
+        """
+        reason = "dangling_movie" if self.min_year is None else "filtered"
+        for person_id, movie_id in self.rows("stars.csv", ("person_id", "movie_id")):
+            if movie_id not in movie_ids:
+                self.drop(reason, "stars.csv", person_id, movie_id)
+            elif person_id not in person_ids:
+                self.drop("dangling_person", "stars.csv", person_id, movie_id)
+            else:
+                yield person_id, movie_id
+
+    def people(self, person_ids=None):
+        """
+        Yields (person_id, name, birth) for every person, or only those
+        in `person_ids` if given.
+        """
+        for person_id, name, birth in self.rows("people.csv", ("id", "name", "birth")):
+            if person_ids is not None and person_id not in person_ids:
+                self.drop("filtered", "people.csv", person_id)
+                continue
+            yield person_id, name, birth
+
+    def rows(self, filename, columns, quiet=False):
+        """
+        Yields tuples of the named `columns` from every well-formed row
+        of `filename`, reporting progress as it goes unless `quiet`.
+        """
+        start = time.perf_counter()
+        count = 0
+        with open(f"{self.directory}/{filename}", encoding="utf-8", newline="") as f:
+            reader = csv.reader(f)
+            header = next(reader, [])
+            try:
+                positions = [header.index(column) for column in columns]
+            except ValueError:
+                raise ValueError(f"{filename} must have columns {', '.join(columns)}")
+            width = len(header)
+
+            for row in reader:
+                count += 1
+                if len(row) == width:
+                    yield tuple(row[i] for i in positions)
+                elif not quiet:
+                    self.drop("malformed", filename, *row)
+                if self.progress and not quiet and count % PROGRESS_EVERY == 0:
+                    self.report(filename, count, start)
+
+        if self.progress and not quiet:
+            self.report(filename, count, start, done=True)
+
+    def drop(self, reason, filename, *fields):
+        """Counts a dropped row, logging it if requested."""
+        self.dropped[reason] += 1
+        if self.log:
+            print(f"dropped ({reason}) {filename}: {','.join(fields)}", file=self.log)
+
+    def report(self, filename, count, start, done=False):
+        """Prints rows read so far from `filename` and the read rate."""
+        elapsed = time.perf_counter() - start
+        rate = count / elapsed if elapsed else 0
+        status = "done" if done else "reading"
+        print(f"{filename}: {status}, {count:,} rows ({rate:,.0f} rows/s)",
+              file=self.progress, flush=True)
+
+    def summary(self):
+        """Returns a one-line description of the dropped rows."""
+        if not self.dropped:
+            return "No rows dropped."
+        counts = ", ".join(f"{count:,} {reason}" for reason, count in sorted(self.dropped.items()))
+        return f"Dropped rows: {counts}."
+
+
+def released_since(year, min_year):
+    """Returns whether a CSV `year` field is `min_year` or later."""
+    try:
+        return int(year) >= min_year
+    except ValueError:
+        return False
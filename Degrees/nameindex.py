@@ -0,0 +1,149 @@
+import heapq
+import os
+import pickle
+from array import array
+from bisect import bisect_left
+from collections import Counter
+
+# At most this many candidates are scored per fuzzy lookup
+MAX_CANDIDATES = 200
+
+# Fuzzy lookups stop gathering candidates after scanning this many
+# posting entries, skipping the commonest trigrams
+MAX_SCANNED = 20000
+
+# Prefix lookups rank at most this many of the names the query begins
+MAX_PREFIXES = 20000
+
+# Saved index layout; bump the version when it changes
+INDEX_VERSION = 1
+
+
+class NameIndex():
+    """
+    Prefix and typo-tolerant lookup over lowercase names.
+
+    Names are kept sorted for prefix search by bisection, and a trigram
+    inverted index (trigram -> sorted positions of the names containing
+    it) finds names sharing most of a query's trigrams, ranked by their
+    Dice similarity computed from each name's stored trigram count.
+    """
+
+    def __init__(self, names):
+        """
+        Builds the index from a mapping of lowercase name -> person ids.
+        """
+        self.keys = sorted(names)
+        self.ids = [tuple(sorted(names[key])) for key in self.keys]
+        self.gram_counts = array("l")
+
+        postings = {}
+        for i, key in enumerate(self.keys):
+            grams = trigrams(key)
+            self.gram_counts.append(len(grams))
+            for gram in grams:
+                posting = postings.get(gram)
+                if posting is None:
+                    postings[gram] = posting = array("l")
+                posting.append(i)
+        self.postings = postings
+
+    def save(self, path, stamp):
+        """Write the index to file `path`, tagged with a source `stamp`."""
+        with open(path + ".tmp", "wb") as f:
+            pickle.dump((INDEX_VERSION, stamp, self.keys, self.ids, self.gram_counts,
+                         self.postings), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(path + ".tmp", path)
+
+    @classmethod
+    def load(cls, path, stamp):
+        """
+        Load an index written by `save`, or return None if it is missing,
+        unreadable, from another version or built from other sources.
+        """
+        try:
+            with open(path, "rb") as f:
+                version, saved_stamp, *state = pickle.load(f)
+        except (OSError, ValueError, EOFError, pickle.UnpicklingError):
+            return None
+        if version != INDEX_VERSION or saved_stamp != stamp:
+            return None
+        index = cls.__new__(cls)
+        index.keys, index.ids, index.gram_counts, index.postings = state
+        return index
+
+    def lookup(self, query, limit=10):
+        """
+        Returns up to `limit` (score, name, person_ids) candidates for
+        `query`, best first. An exact match scores 1, prefix matches score
+        higher the more of the name they cover, and other names score by
+        trigram similarity.
+        """
+        query = normalize(query)
+        if not query:
+            return []
+        scores = {}
+
+        # Exact and prefix matches are adjacent in the sorted names, and
+        # the shortest of them score highest. They outscore any trigram
+        # match, so an exact match or enough prefix matches skip the
+        # trigram search
+        first = bisect_left(self.keys, query)
+        last = bisect_left(self.keys, query + chr(0x10FFFF), first)
+        prefixes = range(first, min(last, first + MAX_PREFIXES))
+        for i in heapq.nsmallest(limit, prefixes, key=lambda i: len(self.keys[i])):
+            scores[i] = 0.5 + 0.5 * len(query) / len(self.keys[i])
+        exact = first < len(self.keys) and self.keys[first] == query
+        if len(scores) < limit and not exact:
+            self.score_similar(query, scores)
+
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], self.keys[item[0]]))
+        return [(score, self.keys[i], self.ids[i]) for i, score in ranked[:limit]]
+
+    def score_similar(self, query, scores):
+        """
+        Adds the Dice similarity of names sharing trigrams with `query`
+        to `scores` (name position -> score).
+        """
+        # Names within a few typos share at least one of the query's rarer
+        # trigrams, since one edit changes at most three of them
+        grams = trigrams(query)
+        ranked = sorted(grams, key=lambda gram: len(self.postings.get(gram, ())))
+        rare, common = ranked[:len(ranked) // 2 + 1], ranked[len(ranked) // 2 + 1:]
+        candidates = Counter()
+        scanned = 0
+        for gram in rare:
+            posting = self.postings.get(gram, ())
+            if candidates and scanned + len(posting) > MAX_SCANNED:
+                break
+            candidates.update(posting)
+            scanned += len(posting)
+
+        # Count the remaining shared trigrams: intersect short postings
+        # with the candidates, and bisect long ones per candidate
+        shared = dict(candidates.most_common(MAX_CANDIDATES))
+        for gram in common:
+            posting = self.postings.get(gram, ())
+            if len(posting) <= 8 * len(shared):
+                for i in shared.keys() & posting:
+                    shared[i] += 1
+                continue
+            for i in shared:
+                j = bisect_left(posting, i)
+                if j < len(posting) and posting[j] == i:
+                    shared[i] += 1
+
+        for i, count in shared.items():
+            if i not in scores:
+                scores[i] = 2 * count / (len(grams) + self.gram_counts[i])
+
+
+def normalize(name):
+    """Lowercases a name and collapses its whitespace."""
+    return " ".join(name.lower().split())
+
+
+def trigrams(name):
+    """Returns the set of padded three-character substrings of `name`."""
+    padded = f"  {name} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
@@ -1,19 +1,99 @@
+import functools
 import itertools
+import multiprocessing
+import weakref
+
+# Compiled sentence functions kept, least recently used first out
+COMPILE_CACHE_SIZE = 1024
+
+# Live sentences by class and arguments, so equal sentences are one object
+interned = weakref.WeakValueDictionary()
+
+# (knowledge, queries, symbols) checked by pool workers, set by init_worker
+worker_problem = None
 
 
 class Sentence():
+    """
+    Immutable logical sentence.
+
+    Sentences are hash-consed: constructing a sentence equal to one that
+    already exists returns the existing object, so identical subtrees are
+    shared, equality is identity, and the hash and symbol set are
+    computed once when the sentence is created.
+    """
+
+    __slots__ = ("arguments", "cached_hash", "cached_symbols", "__weakref__")
+
+    def __new__(cls, *arguments):
+        return Sentence.intern(cls, arguments, frozenset())
+
+    @staticmethod
+    def intern(cls, arguments, symbols, **fields):
+        """
+        Returns the sentence of class `cls` built from `arguments`,
+        creating it with `fields` and `symbols` if it does not exist yet.
+        """
+        key = (cls, arguments)
+        sentence = interned.get(key)
+        if sentence is None:
+            sentence = object.__new__(cls)
+            object.__setattr__(sentence, "arguments", arguments)
+            object.__setattr__(sentence, "cached_hash", hash((cls.__name__, arguments)))
+            object.__setattr__(sentence, "cached_symbols", symbols)
+            for name, value in fields.items():
+                object.__setattr__(sentence, name, value)
+            interned[key] = sentence
+        return sentence
+
+    def __setattr__(self, name, value):
+        raise AttributeError("sentences are immutable")
+
+    def __eq__(self, other):
+        return self is other
+
+    def __hash__(self):
+        return self.cached_hash
+
+    def __reduce__(self):
+        return (type(self), self.arguments)
 
     def evaluate(self, model):
         """Evaluates the logical sentence."""
         raise Exception("nothing to evaluate")
 
+    def truth(self, columns, mask):
+        """
+        Evaluates the logical sentence in many models at once. `columns`
+        maps each symbol to an int whose bit m is its value in model m,
+        and `mask` has a bit set for every model; returns the int of the
+        models the sentence is true in.
+        """
+        raise Exception("nothing to evaluate")
+
+    def expression(self, program):
+        """
+        Returns a Python operand (a variable or constant) holding the
+        value of the logical sentence, adding any statements computing
+        it to `program`, a Program.
+        """
+        raise Exception("nothing to evaluate")
+
+    def compile(self, symbols):
+        """
+        Returns a function taking one bool per symbol, in the order of
+        `symbols`, that evaluates the logical sentence. Functions are
+        cached per sentence and symbol order.
+        """
+        return compile_sentence(self, tuple(symbols))
+
     def formula(self):
         """Returns string formula representing logical sentence."""
         return ""
 
     def symbols(self):
         """Returns a set of all symbols in the logical sentence."""
-        return set()
+        return set(self.cached_symbols)
 
     @classmethod
     def validate(cls, sentence):
@@ -43,15 +123,10 @@ class Sentence():
 
 
 class Symbol(Sentence):
+    __slots__ = ("name",)
 
-    def __init__(self, name):
-        self.name = name
-
-    def __eq__(self, other):
-        return isinstance(other, Symbol) and self.name == other.name
-
-    def __hash__(self):
-        return hash(("symbol", self.name))
+    def __new__(cls, name):
+        return Sentence.intern(cls, (name,), frozenset((name,)), name=name)
 
     def __repr__(self):
         return self.name
@@ -62,23 +137,29 @@ class Symbol(Sentence):
         except KeyError:
             raise Exception(f"variable {self.name} not in model")
 
+    def truth(self, columns, mask):
+        try:
+            return columns[self.name]
+        except KeyError:
+            raise Exception(f"variable {self.name} not in model")
+
+    def expression(self, program):
+        try:
+            return program.arguments[self.name]
+        except KeyError:
+            raise Exception(f"variable {self.name} not in model")
+
     def formula(self):
         return self.name
 
-    def symbols(self):
-        return {self.name}
 
 
 class Not(Sentence):
-    def __init__(self, operand):
-        Sentence.validate(operand)
-        self.operand = operand
+    __slots__ = ("operand",)
 
-    def __eq__(self, other):
-        return isinstance(other, Not) and self.operand == other.operand
-
-    def __hash__(self):
-        return hash(("not", hash(self.operand)))
+    def __new__(cls, operand):
+        Sentence.validate(operand)
+        return Sentence.intern(cls, (operand,), operand.cached_symbols, operand=operand)
 
     def __repr__(self):
         return f"Not({self.operand})"
@@ -86,26 +167,25 @@ class Not(Sentence):
     def evaluate(self, model):
         return not self.operand.evaluate(model)
 
+    def truth(self, columns, mask):
+        return self.operand.truth(columns, mask) ^ mask
+
+    def expression(self, program):
+        return program.assign(f"not {program.value(self.operand)}")
+
     def formula(self):
         return "¬" + Sentence.parenthesize(self.operand.formula())
 
-    def symbols(self):
-        return self.operand.symbols()
 
 
 class And(Sentence):
-    def __init__(self, *conjuncts):
+    __slots__ = ("conjuncts",)
+
+    def __new__(cls, *conjuncts):
         for conjunct in conjuncts:
             Sentence.validate(conjunct)
-        self.conjuncts = list(conjuncts)
-
-    def __eq__(self, other):
-        return isinstance(other, And) and self.conjuncts == other.conjuncts
-
-    def __hash__(self):
-        return hash(
-            ("and", tuple(hash(conjunct) for conjunct in self.conjuncts))
-        )
+        symbols = frozenset().union(*(conjunct.cached_symbols for conjunct in conjuncts))
+        return Sentence.intern(cls, conjuncts, symbols, conjuncts=conjuncts)
 
     def __repr__(self):
         conjunctions = ", ".join(
@@ -114,35 +194,41 @@ class And(Sentence):
         return f"And({conjunctions})"
 
     def add(self, conjunct):
-        Sentence.validate(conjunct)
-        self.conjuncts.append(conjunct)
+        """Returns this conjunction with `conjunct` added."""
+        return And(*self.conjuncts, conjunct)
 
     def evaluate(self, model):
         return all(conjunct.evaluate(model) for conjunct in self.conjuncts)
 
+    def truth(self, columns, mask):
+        result = mask
+        for conjunct in self.conjuncts:
+            result &= conjunct.truth(columns, mask)
+        return result
+
+    def expression(self, program):
+        if not self.conjuncts:
+            return "True"
+        return program.assign(" and ".join(
+            program.value(conjunct) for conjunct in self.conjuncts
+        ))
+
     def formula(self):
         if len(self.conjuncts) == 1:
             return self.conjuncts[0].formula()
         return " ∧ ".join([Sentence.parenthesize(conjunct.formula())
                            for conjunct in self.conjuncts])
 
-    def symbols(self):
-        return set.union(*[conjunct.symbols() for conjunct in self.conjuncts])
 
 
 class Or(Sentence):
-    def __init__(self, *disjuncts):
+    __slots__ = ("disjuncts",)
+
+    def __new__(cls, *disjuncts):
         for disjunct in disjuncts:
             Sentence.validate(disjunct)
-        self.disjuncts = list(disjuncts)
-
-    def __eq__(self, other):
-        return isinstance(other, Or) and self.disjuncts == other.disjuncts
-
-    def __hash__(self):
-        return hash(
-            ("or", tuple(hash(disjunct) for disjunct in self.disjuncts))
-        )
+        symbols = frozenset().union(*(disjunct.cached_symbols for disjunct in disjuncts))
+        return Sentence.intern(cls, disjuncts, symbols, disjuncts=disjuncts)
 
     def __repr__(self):
         disjuncts = ", ".join([str(disjunct) for disjunct in self.disjuncts])
@@ -151,30 +237,36 @@ class Or(Sentence):
     def evaluate(self, model):
         return any(disjunct.evaluate(model) for disjunct in self.disjuncts)
 
+    def truth(self, columns, mask):
+        result = 0
+        for disjunct in self.disjuncts:
+            result |= disjunct.truth(columns, mask)
+        return result
+
+    def expression(self, program):
+        if not self.disjuncts:
+            return "False"
+        return program.assign(" or ".join(
+            program.value(disjunct) for disjunct in self.disjuncts
+        ))
+
     def formula(self):
         if len(self.disjuncts) == 1:
             return self.disjuncts[0].formula()
         return " ∨  ".join([Sentence.parenthesize(disjunct.formula())
                             for disjunct in self.disjuncts])
 
-    def symbols(self):
-        return set.union(*[disjunct.symbols() for disjunct in self.disjuncts])
 
 
 class Implication(Sentence):
-    def __init__(self, antecedent, consequent):
+    __slots__ = ("antecedent", "consequent")
+
+    def __new__(cls, antecedent, consequent):
         Sentence.validate(antecedent)
         Sentence.validate(consequent)
-        self.antecedent = antecedent
-        self.consequent = consequent
-
-    def __eq__(self, other):
-        return (isinstance(other, Implication)
-                and self.antecedent == other.antecedent
-                and self.consequent == other.consequent)
-
-    def __hash__(self):
-        return hash(("implies", hash(self.antecedent), hash(self.consequent)))
+        symbols = antecedent.cached_symbols | consequent.cached_symbols
+        return Sentence.intern(cls, (antecedent, consequent), symbols,
+                               antecedent=antecedent, consequent=consequent)
 
     def __repr__(self):
         return f"Implication({self.antecedent}, {self.consequent})"
@@ -183,29 +275,30 @@ class Implication(Sentence):
         return ((not self.antecedent.evaluate(model))
                 or self.consequent.evaluate(model))
 
+    def truth(self, columns, mask):
+        return ((self.antecedent.truth(columns, mask) ^ mask)
+                | self.consequent.truth(columns, mask))
+
+    def expression(self, program):
+        antecedent = program.value(self.antecedent)
+        consequent = program.value(self.consequent)
+        return program.assign(f"not {antecedent} or {consequent}")
+
     def formula(self):
         antecedent = Sentence.parenthesize(self.antecedent.formula())
         consequent = Sentence.parenthesize(self.consequent.formula())
         return f"{antecedent} => {consequent}"
 
-    def symbols(self):
-        return set.union(self.antecedent.symbols(), self.consequent.symbols())
 
 
 class Biconditional(Sentence):
-    def __init__(self, left, right):
+    __slots__ = ("left", "right")
+
+    def __new__(cls, left, right):
         Sentence.validate(left)
         Sentence.validate(right)
-        self.left = left
-        self.right = right
-
-    def __eq__(self, other):
-        return (isinstance(other, Biconditional)
-                and self.left == other.left
-                and self.right == other.right)
-
-    def __hash__(self):
-        return hash(("biconditional", hash(self.left), hash(self.right)))
+        symbols = left.cached_symbols | right.cached_symbols
+        return Sentence.intern(cls, (left, right), symbols, left=left, right=right)
 
     def __repr__(self):
         return f"Biconditional({self.left}, {self.right})"
@@ -216,48 +309,188 @@ class Biconditional(Sentence):
                 or (not self.left.evaluate(model)
                     and not self.right.evaluate(model)))
 
+    def truth(self, columns, mask):
+        return (self.left.truth(columns, mask)
+                ^ self.right.truth(columns, mask)
+                ^ mask)
+
+    def expression(self, program):
+        left = program.value(self.left)
+        right = program.value(self.right)
+        return program.assign(f"{left} == {right}")
+
     def formula(self):
         left = Sentence.parenthesize(str(self.left))
         right = Sentence.parenthesize(str(self.right))
         return f"{left} <=> {right}"
 
-    def symbols(self):
-        return set.union(self.left.symbols(), self.right.symbols())
 
 
-def model_check(knowledge, query):
-    """Checks if knowledge base entails query."""
-
-    def check_all(knowledge, query, symbols, model):
-        """Checks if knowledge base entails query, given a particular model."""
-
-        # If model has an assignment for each symbol
-        if not symbols:
-            #print(model)
-            # If knowledge base is true in model, then query must also be true
-            if knowledge.evaluate(model):
-                return query.evaluate(model)
-            return True
-        else:
-
-            # Choose one of the remaining unused symbols
-            remaining = symbols.copy()
-            p = remaining.pop()
+@functools.lru_cache(maxsize=COMPILE_CACHE_SIZE)
+def compile_sentence(sentence, symbols):
+    """
+    Returns a generated function evaluating `sentence` with the symbols
+    in `symbols` as positional bool arguments: straight-line code with
+    one statement per distinct subsentence instead of a method call per
+    node, and no nesting however deep the sentence is.
+    """
+    program = Program(symbols)
+    result = program.value(sentence)
+    parameters = ", ".join(program.arguments.values())
+    body = "".join(f"    {line}\n" for line in program.lines)
+    namespace = {}
+    exec(f"def compiled({parameters}):\n{body}    return {result}\n", namespace)
+    return namespace["compiled"]
+
+
+class Program():
+    """
+    Straight-line Python statements being generated by compile_sentence,
+    each storing one subsentence's value in a temporary variable.
+    """
+
+    def __init__(self, symbols):
+        self.arguments = {symbol: f"p{i}" for i, symbol in enumerate(symbols)}
+        self.lines = []
+        self.values = {}
+
+    def value(self, sentence):
+        """
+        Returns the operand holding `sentence`, computing it once. Nodes
+        are visited children first from an explicit stack, so deep
+        sentences do not recurse.
+        """
+        stack = [sentence]
+        while stack:
+            node = stack[-1]
+            if node in self.values:
+                stack.pop()
+                continue
+            pending = [
+                child for child in node.arguments
+                if isinstance(child, Sentence) and child not in self.values
+            ]
+            if pending:
+                stack.extend(pending)
+                continue
+            stack.pop()
+            self.values[node] = node.expression(self)
+        return self.values[sentence]
+
+    def assign(self, source):
+        """Adds a statement computing `source`; returns its variable."""
+        name = f"t{len(self.lines)}"
+        self.lines.append(f"{name} = {source}")
+        return name
+
+
+def truth_columns(symbols):
+    """
+    Returns (columns, mask) enumerating every model of `symbols` as bits:
+    in model m, the i-th symbol is true if bit i of m is set, so its
+    column repeats 2 ** i false models followed by 2 ** i true ones.
+    """
+    models = 1 << len(symbols)
+    columns = {}
+    for i, symbol in enumerate(symbols):
+        column = ((1 << (1 << i)) - 1) << (1 << i)
+
+        # Repeat the pattern by doubling it until it covers every model
+        width = 1 << (i + 1)
+        while width < models:
+            column |= column << width
+            width <<= 1
+        columns[symbol] = column
+    return columns, (1 << models) - 1
 
-            # Create a model where the symbol is true
-            model_true = model.copy()
-            model_true[p] = True
 
-            # Create a model where the symbol is false
-            model_false = model.copy()
-            model_false[p] = False
+def model_check(knowledge, query):
+    """Checks if knowledge base entails query."""
 
-            # Ensure entailment holds in both models
-            return (check_all(knowledge, query, remaining, model_true) and
-                    check_all(knowledge, query, remaining, model_false))
+    # Get all symbols in both knowledge and query
+    symbols = sorted(set.union(knowledge.symbols(), query.symbols()))
+
+    # Evaluate both in all 2 ** n models at once, one bit per model
+    columns, mask = truth_columns(symbols)
+
+    # Check the query is true in every model the knowledge base is true in
+    return knowledge.truth(columns, mask) & ~query.truth(columns, mask) == 0
+
+
+def entailed_literals(knowledge, queries, processes=None, split=None):
+    """
+    Returns the set of literals the knowledge base entails among
+    `queries` and their negations: a query if every model of the
+    knowledge base satisfies it, and Not(query) if none does.
+
+    The knowledge base is evaluated over all models once, as bitsets,
+    and every query is checked against that. With `processes`, the
+    models are split across a pool of workers by fixing the first
+    `split` symbols each possible way, by default enough for four parts
+    per process.
+    """
+    queries = list(queries)
+    symbols = sorted(set.union(knowledge.symbols(), *(query.symbols() for query in queries)))
+
+    if processes is None:
+        results = [check_models(knowledge, queries, symbols, ())]
+    else:
+        if split is None:
+            split = min(len(symbols), (4 * processes - 1).bit_length())
+        prefixes = itertools.product((True, False), repeat=split)
+        with multiprocessing.Pool(processes, initializer=init_worker,
+                                  initargs=(knowledge, queries, symbols)) as pool:
+            results = pool.map(check_worker, prefixes)
+
+    entailed = set()
+    for i, query in enumerate(queries):
+        if all(result[i][0] for result in results):
+            entailed.add(query)
+        if all(result[i][1] for result in results):
+            entailed.add(Not(query))
+    return entailed
+
+
+def check_models(knowledge, queries, symbols, fixed):
+    """
+    Returns (entailed, refuted) for each query over the models where
+    the first symbols take the values in `fixed`.
+    """
+    columns, mask = truth_columns(symbols[len(fixed):])
+    for symbol, value in zip(symbols, fixed):
+        columns[symbol] = mask if value else 0
+
+    models = knowledge.truth(columns, mask)
+    return [
+        (models & ~truth == 0, models & truth == 0)
+        for truth in (query.truth(columns, mask) for query in queries)
+    ]
+
+
+def init_worker(knowledge, queries, symbols):
+    """Pool initializer: keeps the problem for this worker's tasks."""
+    global worker_problem
+    worker_problem = (knowledge, queries, symbols)
+
+
+def check_worker(fixed):
+    """Pool task: checks the queries over one share of the models."""
+    knowledge, queries, symbols = worker_problem
+    return check_models(knowledge, queries, symbols, fixed)
+
+
+def model_check_enumerate(knowledge, query):
+    """Checks if knowledge base entails query, one model at a time."""
 
     # Get all symbols in both knowledge and query
-    symbols = set.union(knowledge.symbols(), query.symbols())
+    symbols = sorted(set.union(knowledge.symbols(), query.symbols()))
+
+    # Compile both to functions of one bool per symbol
+    knowledge = knowledge.compile(symbols)
+    query = query.compile(symbols)
 
-    # Check that knowledge entails query
-    return check_all(knowledge, query, symbols, dict())
+    # If knowledge base is true in a model, then query must also be true
+    for model in itertools.product((True, False), repeat=len(symbols)):
+        if knowledge(*model) and not query(*model):
+            return False
+    return True
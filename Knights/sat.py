@@ -0,0 +1,317 @@
+from logic import (And, Biconditional, Implication, Not, Or, Symbol,
+                   model_check, model_check_enumerate)
+
+
+class CNF():
+    """
+    Clauses in conjunctive normal form over variables numbered from 1,
+    with a literal being a variable or its negation (-variable).
+
+    Sentences are added by Tseitin encoding: every compound subsentence
+    gets a fresh variable constrained to equal it, so the clauses grow
+    linearly with the sentence instead of exponentially as when
+    distributing Or over And.
+    """
+
+    def __init__(self):
+        self.clauses = []
+        self.variables = {}
+        self.count = 0
+        self.literals = {}
+
+    def variable(self, name=None):
+        """Returns the variable of symbol `name`, or a fresh one."""
+        if name is not None and name in self.variables:
+            return self.variables[name]
+        self.count += 1
+        if name is not None:
+            self.variables[name] = self.count
+        return self.count
+
+    def add(self, sentence):
+        """Adds clauses making `sentence` true."""
+        if isinstance(sentence, And):
+            for conjunct in sentence.conjuncts:
+                self.add(conjunct)
+        elif isinstance(sentence, Or):
+            self.clauses.append([self.literal(disjunct) for disjunct in sentence.disjuncts])
+        elif isinstance(sentence, Implication):
+            self.clauses.append([-self.literal(sentence.antecedent),
+                                 self.literal(sentence.consequent)])
+        else:
+            self.clauses.append([self.literal(sentence)])
+
+    def literal(self, sentence):
+        """
+        Returns a literal equal to `sentence`, adding the clauses defining
+        any new variables. Identical subsentences share a literal.
+        """
+        if isinstance(sentence, Symbol):
+            return self.variable(sentence.name)
+        if isinstance(sentence, Not):
+            return -self.literal(sentence.operand)
+        if sentence in self.literals:
+            return self.literals[sentence]
+
+        if isinstance(sentence, (And, Or)):
+            parts = sentence.conjuncts if isinstance(sentence, And) else sentence.disjuncts
+            sign = 1 if isinstance(sentence, And) else -1
+            literals = [sign * self.literal(part) for part in parts]
+            v = self.variable()
+
+            # And: v => each part, and all parts => v; Or is the dual
+            for literal in literals:
+                self.clauses.append([-sign * v, literal])
+            self.clauses.append([sign * v] + [-literal for literal in literals])
+            literal = v
+        elif isinstance(sentence, Implication):
+            literal = self.literal(Or(Not(sentence.antecedent), sentence.consequent))
+        elif isinstance(sentence, Biconditional):
+            a, b = self.literal(sentence.left), self.literal(sentence.right)
+            v = self.variable()
+            self.clauses.extend([[-v, -a, b], [-v, a, -b], [v, a, b], [v, -a, -b]])
+            literal = v
+        else:
+            raise TypeError("must be a logical sentence")
+
+        self.literals[sentence] = literal
+        return literal
+
+
+class Solver():
+    """
+    Conflict-driven clause learning SAT solver.
+
+    Each clause watches two of its literals and is only visited when one
+    of them becomes false, either finding another literal to watch or
+    propagating the other watched literal. A conflict is analyzed back
+    to its first unique implication point, the learned clause is added,
+    and the search jumps back to the level where that clause becomes
+    unit. Decisions pick the most active variable, bumping the
+    variables involved in each conflict.
+    """
+
+    def __init__(self, clauses, count):
+        self.count = count
+        self.values = [0] * (count + 1)
+        self.levels = [0] * (count + 1)
+        self.reasons = [None] * (count + 1)
+        self.activity = [0.0] * (count + 1)
+        self.increment = 1.0
+        self.trail = []
+        self.limits = []
+        self.head = 0
+        self.clauses = []
+        self.watches = {}
+        self.conflicting = False
+
+        for clause in clauses:
+            literals = set(clause)
+            if any(-literal in literals for literal in literals):
+                continue
+            self.attach(list(literals))
+
+    def value(self, literal):
+        """Returns 1 if `literal` is true, -1 if false, 0 if unassigned."""
+        value = self.values[abs(literal)]
+        return value if literal > 0 else -value
+
+    def attach(self, clause, reason=False):
+        """Adds a clause, watching its first two literals."""
+        if not clause:
+            self.conflicting = True
+            return
+        if len(clause) == 1:
+            if self.value(clause[0]) < 0:
+                self.conflicting = True
+            elif self.value(clause[0]) == 0:
+                self.assign(clause[0], None)
+            return
+        index = len(self.clauses)
+        self.clauses.append(clause)
+        self.watches.setdefault(clause[0], []).append(index)
+        self.watches.setdefault(clause[1], []).append(index)
+        if reason:
+            self.assign(clause[0], index)
+
+    def assign(self, literal, reason):
+        variable = abs(literal)
+        self.values[variable] = 1 if literal > 0 else -1
+        self.levels[variable] = len(self.limits)
+        self.reasons[variable] = reason
+        self.trail.append(literal)
+
+    def propagate(self):
+        """
+        Assigns every literal implied by unit clauses. Returns the index
+        of a clause that became false, or None.
+        """
+        while self.head < len(self.trail):
+            false = -self.trail[self.head]
+            self.head += 1
+            watching = self.watches.get(false, [])
+            kept = []
+            for position, index in enumerate(watching):
+                clause = self.clauses[index]
+                if clause[0] == false:
+                    clause[0], clause[1] = clause[1], clause[0]
+                if self.value(clause[0]) > 0:
+                    kept.append(index)
+                    continue
+
+                # Look for another literal that is not false to watch
+                for k in range(2, len(clause)):
+                    if self.value(clause[k]) >= 0:
+                        clause[1], clause[k] = clause[k], clause[1]
+                        self.watches.setdefault(clause[1], []).append(index)
+                        break
+                else:
+                    kept.append(index)
+                    if self.value(clause[0]) < 0:
+                        kept.extend(watching[position + 1:])
+                        self.watches[false] = kept
+                        return index
+                    self.assign(clause[0], index)
+            self.watches[false] = kept
+        return None
+
+    def analyze(self, conflict):
+        """
+        Returns (clause, level): the clause learned from a conflict, with
+        its asserting literal first, and the level to jump back to.
+        """
+        level = len(self.limits)
+        seen = set()
+        learned = [None]
+        pending = 0
+        literal = None
+        index = len(self.trail)
+        reason = self.clauses[conflict]
+
+        while True:
+            for other in reason:
+                if other == literal:
+                    continue
+                variable = abs(other)
+                if variable in seen or self.levels[variable] == 0:
+                    continue
+                seen.add(variable)
+                self.bump(variable)
+                if self.levels[variable] == level:
+                    pending += 1
+                else:
+                    learned.append(other)
+
+            # Walk back along the trail to the next literal to resolve on
+            index -= 1
+            while abs(self.trail[index]) not in seen:
+                index -= 1
+            literal = self.trail[index]
+            pending -= 1
+            if pending == 0:
+                break
+            reason = self.clauses[self.reasons[abs(literal)]]
+
+        learned[0] = -literal
+        self.increment *= 1.05
+        if len(learned) == 1:
+            return learned, 0
+
+        # Watch the literal of the highest remaining level second
+        highest = max(range(1, len(learned)), key=lambda i: self.levels[abs(learned[i])])
+        learned[1], learned[highest] = learned[highest], learned[1]
+        return learned, self.levels[abs(learned[1])]
+
+    def bump(self, variable):
+        self.activity[variable] += self.increment
+        if self.activity[variable] > 1e100:
+            self.activity = [activity * 1e-100 for activity in self.activity]
+            self.increment *= 1e-100
+
+    def backtrack(self, level):
+        """Undoes every assignment above decision `level`."""
+        if len(self.limits) <= level:
+            return
+        for literal in self.trail[self.limits[level]:]:
+            self.values[abs(literal)] = 0
+            self.reasons[abs(literal)] = None
+        del self.trail[self.limits[level]:]
+        del self.limits[level:]
+        self.head = len(self.trail)
+
+    def decide(self):
+        """Returns the unassigned variable of highest activity, or None."""
+        best = None
+        for variable in range(1, self.count + 1):
+            if self.values[variable] == 0 and (
+                best is None or self.activity[variable] > self.activity[best]
+            ):
+                best = variable
+        return best
+
+    def solve(self):
+        """
+        Returns a satisfying assignment as a list of true literals, or
+        None if the clauses are unsatisfiable.
+        """
+        if self.conflicting:
+            return None
+        while True:
+            conflict = self.propagate()
+            if conflict is not None:
+                if not self.limits:
+                    return None
+                learned, level = self.analyze(conflict)
+                self.backtrack(level)
+                self.attach(learned, reason=True)
+                continue
+
+            variable = self.decide()
+            if variable is None:
+                return list(self.trail)
+            self.limits.append(len(self.trail))
+            self.assign(-variable, None)
+
+
+def satisfiable(sentence):
+    """
+    Returns a model of `sentence` as a symbol name -> bool dictionary,
+    or None if it is unsatisfiable.
+    """
+    cnf = CNF()
+    cnf.add(sentence)
+    for name in sentence.symbols():
+        cnf.variable(name)
+    assignment = Solver(cnf.clauses, cnf.count).solve()
+    if assignment is None:
+        return None
+    true = set(assignment)
+    return {name: variable in true for name, variable in cnf.variables.items()}
+
+
+def sat_check(knowledge, query):
+    """Checks if knowledge base entails query, by refuting KB ∧ ¬query."""
+    return satisfiable(And(knowledge, Not(query))) is None
+
+
+# Entailment checkers selectable by name
+METHODS = {
+    "model-check": model_check,
+    "enumerate": model_check_enumerate,
+    "sat": sat_check,
+}
+
+
+def entails(knowledge, query, method="model-check"):
+    """
+    Checks if knowledge base entails query with one of the METHODS:
+    "model-check" evaluates every model at once as bitsets,
+    "enumerate" one model at a time, and "sat" proves KB ∧ ¬query
+    unsatisfiable, which scales to many more symbols when the knowledge
+    base constrains them.
+    """
+    try:
+        check = METHODS[method]
+    except KeyError:
+        raise ValueError(f"unknown entailment method {method!r}")
+    return check(knowledge, query)
@@ -0,0 +1,207 @@
+import argparse
+import os
+import resource
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+import crawler
+import pagerank
+import sampling
+from matrix import SOLVERS, LinkGraph, power_iteration
+from pagerank import DAMPING, SAMPLES
+
+# Reference ranks are converged this far
+REFERENCE_TOLERANCE = 1e-14
+
+
+def generate_graph(pages, links=8, skew=1.0, dangling=0.1, seed=0):
+    """
+    Return a synthetic LinkGraph of `pages` pages named 0.html, 1.html...
+
+    Each page gets about `links` out-links, and a `dangling` fraction of
+    pages get none. Link targets are chosen with probability
+    proportional to 1 / rank ** `skew`, so skew 0 spreads links
+    uniformly and larger values concentrate them on a few popular pages,
+    like the power-law in-degrees of the web.
+    """
+    rng = np.random.default_rng(seed)
+    degree = np.rint(rng.exponential(links, pages)).astype(np.int64)
+    degree[rng.random(pages) < dangling] = 0
+
+    popularity = 1 / np.arange(1, pages + 1) ** skew
+    popularity = popularity[rng.permutation(pages)]
+    sources = np.repeat(np.arange(pages, dtype=np.int64), degree)
+    targets = rng.choice(pages, size=len(sources), p=popularity / popularity.sum())
+
+    # Drop self-links and repeated links; sorting on the pair also puts
+    # the links in CSR order
+    keys = np.unique(sources * pages + targets)
+    sources, targets = keys // pages, keys % pages
+    keep = sources != targets
+    sources, targets = sources[keep], targets[keep]
+
+    indptr = np.zeros(pages + 1, dtype=np.int64)
+    np.cumsum(np.bincount(sources, minlength=pages), out=indptr[1:])
+    return LinkGraph([f"{i}.html" for i in range(pages)], indptr, targets)
+
+
+def to_corpus(graph):
+    """Return the `crawl` dictionary of a LinkGraph."""
+    return {
+        page: {graph.pages[j] for j in graph.indices[graph.indptr[i]:graph.indptr[i + 1]]}
+        for i, page in enumerate(graph.pages)
+    }
+
+
+def write_corpus(graph, directory):
+    """Write `graph` to `directory` as HTML pages in the corpus format."""
+    os.makedirs(directory, exist_ok=True)
+    for i, page in enumerate(graph.pages):
+        title = page[:-len(".html")]
+        items = "".join(
+            f'            <li><a href="{graph.pages[j]}">{graph.pages[j][:-len(".html")]}</a></li>\n'
+            for j in graph.indices[graph.indptr[i]:graph.indptr[i + 1]]
+        )
+        with open(os.path.join(directory, page), "w", encoding="utf-8") as f:
+            f.write(
+                "<!DOCTYPE html>\n<html lang=\"en\">\n    <head>\n"
+                f"        <title>{title}</title>\n    </head>\n    <body>\n"
+                f"        <h1>{title}</h1>\n\n        <div>Links:</div>\n        <ul>\n"
+                f"{items}        </ul>\n    </body>\n</html>\n"
+            )
+
+
+def rankers(samples, seed):
+    """
+    Returns {name: (function, pure_python)} of the engines to compare,
+    each taking (corpus, graph) and returning a rank array in graph order.
+    """
+    def from_dict(ranks, graph):
+        return np.array([ranks[page] for page in graph.pages])
+
+    engines = {
+        "sample_pagerank": (lambda corpus, graph: from_dict(
+            pagerank.sample_pagerank(corpus, DAMPING, samples), graph), True),
+        "iterate_pagerank": (lambda corpus, graph: from_dict(
+            pagerank.iterate_pagerank(corpus, DAMPING), graph), True),
+        "sample_counts": (lambda corpus, graph: sampling.sample_counts(
+            graph, DAMPING, samples, rng=np.random.default_rng(seed)) / samples, False),
+    }
+    for name, solver in SOLVERS.items():
+        engines[name] = (lambda corpus, graph, solver=solver: solver(graph)[0], False)
+    return engines
+
+
+def run_benchmark(sizes, links=8, skew=1.0, dangling=0.1, samples=SAMPLES, seed=0,
+                  max_python=2000, max_html=20000, processes=None):
+    """
+    Benchmark crawling and ranking synthetic corpora of each size in
+    `sizes`.
+
+    Crawls are timed on HTML corpora of up to `max_html` pages and the
+    pure-Python engines of pagerank.py only run up to `max_python`
+    pages. Returns a list of {size, engine, seconds, pages_per_s, error,
+    peak_rss_mib} rows, where error is the L1 distance from ranks
+    converged to REFERENCE_TOLERANCE (None for crawls, which are instead
+    checked against the generated links).
+    """
+    results = []
+
+    def record(size, engine, seconds, error=None):
+        results.append({
+            "size": size,
+            "engine": engine,
+            "seconds": seconds,
+            "pages_per_s": size / seconds if seconds else float("inf"),
+            "error": error,
+            "peak_rss_mib": peak_rss_mib()
+        })
+
+    for size in sizes:
+        graph = generate_graph(size, links, skew, dangling, seed)
+        reference, _ = power_iteration(graph, tolerance=REFERENCE_TOLERANCE)
+        corpus = to_corpus(graph) if size <= max_python or size <= max_html else None
+
+        if size <= max_html:
+            with tempfile.TemporaryDirectory() as directory:
+                write_corpus(graph, directory)
+                for engine, crawl in [
+                    ("crawl", pagerank.crawl),
+                    ("crawl_parallel", lambda d: crawler.crawl_parallel(d, processes, cache=False))
+                ]:
+                    start = time.perf_counter()
+                    crawled = crawl(directory)
+                    record(size, engine, time.perf_counter() - start)
+                    if crawled != corpus:
+                        raise RuntimeError(f"{engine} did not recover the generated links")
+
+        for engine, (rank, pure_python) in rankers(samples, seed).items():
+            if pure_python and size > max_python:
+                continue
+            start = time.perf_counter()
+            ranks = rank(corpus, graph)
+            record(size, engine, time.perf_counter() - start,
+                   float(np.abs(ranks - reference).sum()))
+
+    return results
+
+
+def peak_rss_mib():
+    """Returns this process's peak resident set size in MiB."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    # Linux reports kilobytes, macOS bytes
+    if sys.platform == "darwin":
+        return peak / 2 ** 20
+    return peak / 2 ** 10
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Generate power-law corpora and benchmark PageRank engines on them."
+    )
+    parser.add_argument("--sizes", default="100,1000,10000,100000",
+                        help="comma-separated corpus sizes in pages")
+    parser.add_argument("--links", type=float, default=8, help="mean out-links per page")
+    parser.add_argument("--skew", type=float, default=1.0,
+                        help="power-law exponent of link target popularity")
+    parser.add_argument("--dangling", type=float, default=0.1,
+                        help="fraction of pages without links")
+    parser.add_argument("--samples", type=int, default=SAMPLES)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--max-python", type=int, default=2000,
+                        help="largest size to run the pure-Python engines on")
+    parser.add_argument("--max-html", type=int, default=20000,
+                        help="largest size to write as HTML and time crawls on")
+    parser.add_argument("--processes", type=int)
+    parser.add_argument("--corpus", metavar="DIR",
+                        help="write an HTML corpus of the first size to DIR instead")
+    parser.add_argument("--export", metavar="PATH",
+                        help="save a link graph of the first size to PATH instead")
+    args = parser.parse_args()
+    sizes = [int(size) for size in args.sizes.split(",")]
+
+    if args.corpus or args.export:
+        graph = generate_graph(sizes[0], args.links, args.skew, args.dangling, args.seed)
+        if args.corpus:
+            write_corpus(graph, args.corpus)
+        if args.export:
+            graph.save(args.export)
+        return
+
+    results = run_benchmark(sizes, args.links, args.skew, args.dangling, args.samples,
+                            args.seed, args.max_python, args.max_html, args.processes)
+
+    print(f"{'pages':>9}  {'engine':<18}{'seconds':>10}{'pages/s':>12}"
+          f"{'L1 error':>11}{'rss MiB':>9}")
+    for result in results:
+        error = "" if result["error"] is None else f"{result['error']:.2e}"
+        print(f"{result['size']:>9}  {result['engine']:<18}{result['seconds']:>10.3f}"
+              f"{result['pages_per_s']:>12,.0f}{error:>11}{result['peak_rss_mib']:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
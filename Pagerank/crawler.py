@@ -0,0 +1,137 @@
+import argparse
+import json
+import multiprocessing
+import os
+import re
+
+from matrix import LinkGraph
+
+# Same link pattern as pagerank.crawl
+LINK = re.compile(r"<a\s+(?:[^>]*?)href=\"([^\"]*)\"")
+
+# Files are read this many characters at a time, and at most this much
+# of an unfinished tag is carried over into the next chunk
+CHUNK_SIZE = 1 << 16
+MAX_TAG = 4096
+
+# Per-directory cache of parsed links, keyed by file name
+CACHE_FILE = ".crawl-cache.json"
+
+
+def extract_links(path):
+    """
+    Return the set of link targets in the HTML file at `path`, reading
+    it in chunks so memory stays flat however large the page is.
+    """
+    links = set()
+    carry = ""
+    with open(path, encoding="utf-8", errors="replace") as f:
+        while True:
+            chunk = f.read(CHUNK_SIZE)
+            buffer = carry + chunk
+            end = 0
+            for match in LINK.finditer(buffer):
+                links.add(match.group(1))
+                end = match.end()
+            if not chunk:
+                return links
+
+            # Keep the tail after the last link, which may hold a tag
+            # that continues in the next chunk
+            carry = buffer[max(end, len(buffer) - MAX_TAG):]
+
+
+def parse_page(job):
+    """Pool task: returns (filename, stamp, links) for one page."""
+    directory, filename, stamp = job
+    return filename, stamp, sorted(extract_links(os.path.join(directory, filename)))
+
+
+def crawl_links(directory, processes=None, cache=True):
+    """
+    Yield (page, links) for every HTML page in `directory` as soon as
+    it is parsed, where links is the set of other pages in the corpus
+    that the page links to.
+
+    Pages are parsed on a pool of worker processes. With `cache`, links
+    are remembered per file together with its mtime and size, so pages
+    that have not changed since the last crawl are not parsed again.
+    """
+    pages = {}
+    for entry in os.scandir(directory):
+        if entry.name.endswith(".html") and entry.is_file():
+            stat = entry.stat()
+            pages[entry.name] = [stat.st_mtime_ns, stat.st_size]
+
+    cached = load_cache(directory) if cache else {}
+    fresh = {}
+
+    def resolve(filename, links):
+        return filename, {link for link in links if link in pages and link != filename}
+
+    # Unchanged pages come straight from the cache
+    stale = []
+    for filename, stamp in pages.items():
+        entry = cached.get(filename)
+        if entry is not None and entry["stamp"] == stamp:
+            fresh[filename] = entry
+            yield resolve(filename, entry["links"])
+        else:
+            stale.append((directory, filename, stamp))
+
+    # Everything else is parsed in parallel, in whatever order it finishes
+    if stale:
+        with multiprocessing.Pool(processes) as pool:
+            chunksize = max(1, len(stale) // (4 * (processes or os.cpu_count() or 1)))
+            for filename, stamp, links in pool.imap_unordered(parse_page, stale, chunksize):
+                fresh[filename] = {"stamp": stamp, "links": links}
+                yield resolve(filename, links)
+
+    if cache and (stale or len(fresh) != len(cached)):
+        save_cache(directory, fresh)
+
+
+def crawl_parallel(directory, processes=None, cache=True):
+    """
+    Return the same dictionary as pagerank.crawl, built with crawl_links.
+    """
+    return dict(crawl_links(directory, processes, cache))
+
+
+def load_cache(directory):
+    """Return the directory's link cache, or {} if missing or unreadable."""
+    try:
+        with open(os.path.join(directory, CACHE_FILE)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_cache(directory, entries):
+    """Write the link cache, skipping read-only directories."""
+    path = os.path.join(directory, CACHE_FILE)
+    try:
+        with open(path + ".tmp", "w") as f:
+            json.dump(entries, f)
+        os.replace(path + ".tmp", path)
+    except OSError:
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Crawl a directory of HTML pages for links.")
+    parser.add_argument("corpus")
+    parser.add_argument("--export", metavar="PATH",
+                        help="save the link graph to PATH instead of printing it")
+    parser.add_argument("--processes", type=int)
+    args = parser.parse_args()
+
+    if args.export:
+        LinkGraph.from_corpus(crawl_parallel(args.corpus, args.processes)).save(args.export)
+        return
+    for page, links in crawl_links(args.corpus, args.processes):
+        print(f"{page}: {', '.join(sorted(links))}")
+
+
+if __name__ == "__main__":
+    main()
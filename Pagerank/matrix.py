@@ -0,0 +1,544 @@
+import argparse
+import functools
+import json
+import os
+
+import numpy as np
+
+from pagerank import DAMPING, crawl
+
+# Stop iterating once the L1 change between sweeps drops below this
+TOLERANCE = 1e-10
+MAX_ITERATIONS = 1000
+
+# Rows of the link matrix multiplied at a time
+BLOCK_ROWS = 1 << 20
+
+# Gauss-Seidel updates the ranks in this many blocks of rows per sweep
+GAUSS_SEIDEL_BLOCKS = 64
+
+# Extrapolated power iteration extrapolates once every this many sweeps
+EXTRAPOLATE_EVERY = 10
+
+# Adaptive iteration rebuilds its reduced matrix once the active pages
+# have shrunk to this fraction of its rows
+FREEZE_REBUILD = 0.75
+
+# Saved link graph layout; bump the version when it changes
+GRAPH_VERSION = 1
+GRAPH_ARRAYS = ("indptr", "indices", "in_indptr", "in_sources")
+
+
+class LinkGraph():
+    """
+    Link graph of a corpus with pages numbered 0..n-1.
+
+    Out-links are stored CSR-style: page i links to
+    `indices[indptr[i]:indptr[i + 1]]`. The transpose is kept as the
+    column-stochastic PageRank matrix M, also CSR: row i holds the pages
+    linking to i, `in_sources[in_indptr[i]:in_indptr[i + 1]]`, each
+    weighted 1 / its out-degree, so M @ ranks spreads every page's rank
+    over its links.
+
+    The arrays may be memory-mapped from a file written by `save`.
+    """
+
+    def __init__(self, pages, indptr, indices, in_indptr=None, in_sources=None):
+        self.pages = pages if isinstance(pages, list) else list(pages)
+        self.n = len(self.pages)
+        self.indptr = np.asarray(indptr, dtype=np.int64)
+        self.indices = np.asarray(indices, dtype=np.int64)
+        self.out_degree = np.diff(self.indptr)
+
+        # Pages without links are treated as linking to every page
+        self.dangling = self.out_degree == 0
+        self.inverse_degree = 1.0 / np.maximum(self.out_degree, 1)
+
+        # Transpose by sorting the links on their target page, unless the
+        # transpose was loaded with the graph
+        if in_indptr is None:
+            sources = np.repeat(np.arange(self.n, dtype=np.int64), self.out_degree)
+            order = np.argsort(self.indices, kind="stable")
+            in_sources = sources[order]
+            in_indptr = np.zeros(self.n + 1, dtype=np.int64)
+            np.cumsum(np.bincount(self.indices, minlength=self.n), out=in_indptr[1:])
+        self.in_indptr = np.asarray(in_indptr, dtype=np.int64)
+        self.in_sources = np.asarray(in_sources, dtype=np.int64)
+
+        # Directory the graph was loaded from, if any
+        self.path = None
+
+    @classmethod
+    def from_corpus(cls, corpus):
+        """
+        Build a LinkGraph from a `crawl` dictionary, ignoring links to
+        pages outside the corpus.
+        """
+        pages = sorted(corpus)
+        index = {page: i for i, page in enumerate(pages)}
+        indptr = [0]
+        indices = []
+        for page in pages:
+            indices.extend(sorted(index[link] for link in corpus[page] if link in index))
+            indptr.append(len(indices))
+        return cls(pages, indptr, indices)
+
+    def save(self, path):
+        """
+        Write the graph to directory `path`: its CSR arrays and their
+        transpose as .npy files, page names one per line in pages.txt,
+        and a versioned meta.json.
+        """
+        os.makedirs(path, exist_ok=True)
+        for name in GRAPH_ARRAYS:
+            np.save(os.path.join(path, f"{name}.npy"), getattr(self, name))
+        with open(os.path.join(path, "pages.txt"), "w", encoding="utf-8") as f:
+            for page in self.pages:
+                f.write(f"{page}\n")
+        with open(os.path.join(path, "meta.json"), "w") as f:
+            json.dump({"version": GRAPH_VERSION, "pages": self.n,
+                       "links": len(self.indices)}, f)
+
+    @classmethod
+    def load(cls, path):
+        """
+        Load a graph written by `save`, memory-mapping its arrays so only
+        the pages touched are read from disk.
+        """
+        with open(os.path.join(path, "meta.json")) as f:
+            meta = json.load(f)
+        if meta["version"] != GRAPH_VERSION:
+            raise ValueError(f"{path} has link graph version {meta['version']}, "
+                             f"expected {GRAPH_VERSION}")
+        with open(os.path.join(path, "pages.txt"), encoding="utf-8") as f:
+            pages = f.read().splitlines()
+        arrays = {
+            name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r")
+            for name in GRAPH_ARRAYS
+        }
+        graph = cls(pages, **arrays)
+        graph.path = path
+        return graph
+
+    def matvec(self, x):
+        """
+        Returns M @ x for the column-stochastic link matrix M, working
+        through the rows in blocks so temporaries stay bounded.
+        """
+        y = np.empty(self.n)
+        for first in range(0, self.n, BLOCK_ROWS):
+            last = min(first + BLOCK_ROWS, self.n)
+            y[first:last] = self.range_product(first, last, x)
+        return y
+
+    def range_product(self, first, last, x):
+        """Returns (M @ x)[first:last], one contiguous block of rows."""
+        start, end = self.in_indptr[first], self.in_indptr[last]
+        sources = self.in_sources[start:end]
+        rows = np.repeat(np.arange(last - first), np.diff(self.in_indptr[first:last + 1]))
+        return np.bincount(rows, weights=x[sources] * self.inverse_degree[sources],
+                           minlength=last - first)
+
+    def reduced(self, rows):
+        """
+        Returns a function computing (M @ x)[rows], with the entries of
+        those rows gathered once so it can be applied repeatedly.
+        """
+        starts = self.in_indptr[rows]
+        lengths = self.in_indptr[rows + 1] - starts
+        offsets = np.cumsum(lengths) - lengths
+        positions = np.arange(lengths.sum()) + np.repeat(starts - offsets, lengths)
+        sources = self.in_sources[positions]
+        weights = self.inverse_degree[sources]
+        targets = np.repeat(np.arange(len(rows)), lengths)
+        return lambda x: np.bincount(targets, weights=x[sources] * weights, minlength=len(rows))
+
+    def matmat(self, x):
+        """
+        Returns M @ x for an (n x k) matrix `x`, one sparse product for
+        all k columns, working through the rows in blocks.
+        """
+        y = np.zeros((self.n, x.shape[1]))
+        for first in range(0, self.n, BLOCK_ROWS):
+            last = min(first + BLOCK_ROWS, self.n)
+            start, end = self.in_indptr[first], self.in_indptr[last]
+            sources = self.in_sources[start:end]
+            contributions = x[sources] * self.inverse_degree[sources, None]
+
+            # Rows are contiguous runs of entries; sum the non-empty ones
+            offsets = self.in_indptr[first:last] - start
+            filled = np.flatnonzero(np.diff(self.in_indptr[first:last + 1]))
+            if len(filled):
+                y[first + filled] = np.add.reduceat(contributions, offsets[filled], axis=0)
+        return y
+
+    @functools.cached_property
+    def index(self):
+        """Page name -> page number."""
+        return {page: i for i, page in enumerate(self.pages)}
+
+    def teleport_vector(self, weights):
+        """
+        Returns a teleport distribution over the pages from a page name ->
+        weight dictionary (or an iterable of page names, weighted
+        equally), normalized to sum 1.
+        """
+        if not isinstance(weights, dict):
+            weights = dict.fromkeys(weights, 1)
+        vector = np.zeros(self.n)
+        for page, weight in weights.items():
+            vector[self.index[page]] = weight
+        if vector.sum() <= 0:
+            raise ValueError("teleport weights must have a positive total")
+        return vector / vector.sum()
+
+    def to_dict(self, ranks):
+        """Returns a page name -> rank dictionary for a rank vector."""
+        return {page: float(rank) for page, rank in zip(self.pages, ranks)}
+
+
+def load_link_graph(path):
+    """
+    Return a LinkGraph for `path`: memory-mapped if it is a graph saved
+    with LinkGraph.save, otherwise crawled as a directory of HTML pages.
+    """
+    if os.path.exists(os.path.join(path, "meta.json")):
+        return LinkGraph.load(path)
+    return LinkGraph.from_corpus(crawl(path))
+
+
+def power_iteration(graph, damping_factor=DAMPING, tolerance=TOLERANCE,
+                    max_iterations=MAX_ITERATIONS, start=None):
+    """
+    Return (ranks, residuals) for `graph` by power iteration.
+
+    Each sweep computes
+        d * (M @ ranks + dangling rank / n) + (1 - d) / n
+    and the L1 change from the previous ranks is appended to
+    `residuals`, stopping once it falls below `tolerance`. Iteration
+    starts from the uniform vector, or from `start` if given.
+    """
+    n = graph.n
+    ranks = np.full(n, 1 / n) if start is None else np.asarray(start, dtype=float)
+    residuals = []
+
+    for _ in range(max_iterations):
+        new_ranks = damping_factor * graph.matvec(ranks)
+        new_ranks += (damping_factor * ranks[graph.dangling].sum() + 1 - damping_factor) / n
+        residuals.append(float(np.abs(new_ranks - ranks).sum()))
+        ranks = new_ranks
+        if residuals[-1] < tolerance:
+            break
+
+    return ranks, residuals
+
+
+def gauss_seidel(graph, damping_factor=DAMPING, tolerance=TOLERANCE,
+                 max_iterations=MAX_ITERATIONS, start=None):
+    """
+    Return (ranks, residuals) for `graph` by block Gauss-Seidel.
+
+    Each sweep applies the same update as power_iteration, but in
+    GAUSS_SEIDEL_BLOCKS blocks of rows, every block already using the
+    ranks the earlier blocks of the sweep just computed. The ranks are
+    renormalized after each sweep, and residuals are the L1 change per
+    sweep; this usually takes a third fewer sweeps than power iteration.
+    """
+    n = graph.n
+    ranks = np.full(n, 1 / n) if start is None else np.asarray(start, dtype=float)
+    size = max(1, -(-n // GAUSS_SEIDEL_BLOCKS))
+    residuals = []
+
+    for _ in range(max_iterations):
+        new_ranks = ranks.copy()
+        teleport = (damping_factor * ranks[graph.dangling].sum() + 1 - damping_factor) / n
+        for first in range(0, n, size):
+            last = min(first + size, n)
+            new_ranks[first:last] = (damping_factor * graph.range_product(first, last, new_ranks)
+                                     + teleport)
+        new_ranks /= new_ranks.sum()
+        residuals.append(float(np.abs(new_ranks - ranks).sum()))
+        ranks = new_ranks
+        if residuals[-1] < tolerance:
+            break
+
+    return ranks, residuals
+
+
+def extrapolated_power_iteration(graph, damping_factor=DAMPING, tolerance=TOLERANCE,
+                                 max_iterations=MAX_ITERATIONS, start=None,
+                                 method="quadratic"):
+    """
+    Return (ranks, residuals) for `graph` by power iteration, jumping
+    ahead every EXTRAPOLATE_EVERY sweeps by extrapolating the last
+    iterates.
+
+    "aitken" applies Aitken's delta-squared process to each page, and
+    "quadratic" fits the last four iterates to the two slowest-decaying
+    error components and removes them (Kamvar et al., 2003). Negative
+    values an extrapolation may produce are clipped before the ranks
+    are renormalized.
+
+    How much extrapolation helps depends on the spectrum of the graph,
+    so an extrapolation is undone if the sweep after it changes the
+    ranks more than the sweep before it, and not tried again.
+    """
+    if method not in ("aitken", "quadratic"):
+        raise ValueError(f"unknown extrapolation {method!r}")
+    extrapolate = aitken if method == "aitken" else quadratic_extrapolation
+    n = graph.n
+    ranks = np.full(n, 1 / n) if start is None else np.asarray(start, dtype=float)
+    history = [ranks]
+    fallback = None
+    residuals = []
+
+    for sweep in range(1, max_iterations + 1):
+        new_ranks = damping_factor * graph.matvec(ranks)
+        new_ranks += (damping_factor * ranks[graph.dangling].sum() + 1 - damping_factor) / n
+        residuals.append(float(np.abs(new_ranks - ranks).sum()))
+        ranks = new_ranks
+        if residuals[-1] < tolerance:
+            break
+
+        # Check the last extrapolation made things better
+        if fallback is not None:
+            if residuals[-1] > residuals[-2]:
+                ranks, extrapolate = fallback, None
+            fallback = None
+
+        history = history[-3:] + [ranks]
+        if extrapolate is not None and sweep % EXTRAPOLATE_EVERY == 0:
+            fallback = ranks
+            ranks = np.maximum(extrapolate(history), 0)
+            ranks /= ranks.sum()
+            history = [ranks]
+
+    return ranks, residuals
+
+
+def aitken(history):
+    """Aitken extrapolation of the last three iterates, page by page."""
+    x0, x1, x2 = history[-3:]
+    step = x2 - x1
+    curvature = step - (x1 - x0)
+    safe = np.abs(curvature) > 1e-15
+    result = x2.copy()
+    result[safe] -= step[safe] ** 2 / curvature[safe]
+    return result
+
+
+def quadratic_extrapolation(history):
+    """Quadratic extrapolation of the last four iterates."""
+    x0, x1, x2, x3 = history[-4:]
+    y = np.column_stack([x1 - x0, x2 - x0])
+    gamma, *_ = np.linalg.lstsq(y, x0 - x3, rcond=None)
+    g1, g2, g3 = gamma[0], gamma[1], 1.0
+    return (g1 + g2 + g3) * x1 + (g2 + g3) * x2 + g3 * x3
+
+
+def adaptive_power_iteration(graph, damping_factor=DAMPING, tolerance=TOLERANCE,
+                             max_iterations=MAX_ITERATIONS, start=None):
+    """
+    Return (ranks, residuals) for `graph` by power iteration that stops
+    recomputing pages once they have converged (Kamvar et al., 2004).
+
+    A page is frozen once it has changed by less than tolerance / n in
+    two sweeps running. Sweeps then only multiply the rows of a reduced
+    matrix, rebuilt whenever the active pages have shrunk to
+    FREEZE_REBUILD of its rows. Frozen pages can still drift as their
+    neighbours change, so when the active pages converge everything is
+    unfrozen for a full sweep, and iteration only stops once a full
+    sweep's L1 change is below `tolerance`.
+
+    The savings depend on how unevenly the pages converge; with a tight
+    tolerance most pages only settle near the end.
+    """
+    n = graph.n
+    ranks = np.full(n, 1 / n) if start is None else np.asarray(start, dtype=float)
+    active = np.ones(n, dtype=bool)
+    settled = np.zeros(n, dtype=bool)
+    rows = None
+    residuals = []
+
+    for _ in range(max_iterations):
+        teleport = (damping_factor * ranks[graph.dangling].sum() + 1 - damping_factor) / n
+        if active.all():
+            rows = None
+            new_ranks = damping_factor * graph.matvec(ranks) + teleport
+        else:
+            if rows is None or active.sum() < FREEZE_REBUILD * len(rows):
+                rows = np.flatnonzero(active)
+                reduced = graph.reduced(rows)
+            new_ranks = ranks.copy()
+            new_ranks[rows] = damping_factor * reduced(ranks) + teleport
+        change = np.abs(new_ranks - ranks)
+        residuals.append(float(change.sum()))
+        ranks = new_ranks
+
+        if residuals[-1] < tolerance:
+            if rows is None:
+                break
+            active[:] = True
+        else:
+            small = change < tolerance / n
+            active &= ~(small & settled)
+            settled = small
+
+    return ranks / ranks.sum(), residuals
+
+
+# Solvers selectable by name; all return (ranks, residuals)
+SOLVERS = {
+    "power": power_iteration,
+    "gauss-seidel": gauss_seidel,
+    "aitken": functools.partial(extrapolated_power_iteration, method="aitken"),
+    "quadratic": functools.partial(extrapolated_power_iteration, method="quadratic"),
+    "adaptive": adaptive_power_iteration,
+}
+
+
+def batched_pagerank(graph, teleports, damping_factor=DAMPING, tolerance=TOLERANCE,
+                     max_iterations=MAX_ITERATIONS):
+    """
+    Return (ranks, residuals) solving personalized PageRank for every
+    row of `teleports` (k teleport distributions over the n pages) at
+    once.
+
+    Each sweep is one sparse product M @ R for the (n x k) rank matrix R:
+        R = d * (M @ R + dangling rank * v) + (1 - d) * v
+    with every column using its own teleport vector v, also for the
+    rank of pages without links. `ranks` is k x n, and `residuals` holds
+    the largest L1 change of any column per sweep, stopping once it
+    falls below `tolerance`.
+    """
+    teleports = np.atleast_2d(np.asarray(teleports, dtype=float)).T
+    teleports = teleports / teleports.sum(axis=0)
+    ranks = teleports.copy()
+    residuals = []
+
+    for _ in range(max_iterations):
+        dangling = ranks[graph.dangling].sum(axis=0)
+        new_ranks = damping_factor * graph.matmat(ranks)
+        new_ranks += (damping_factor * dangling + 1 - damping_factor) * teleports
+        residuals.append(float(np.abs(new_ranks - ranks).sum(axis=0).max()))
+        ranks = new_ranks
+        if residuals[-1] < tolerance:
+            break
+
+    return ranks.T, residuals
+
+
+def personalized_pagerank(graph, teleport, damping_factor=DAMPING, tolerance=TOLERANCE):
+    """
+    Return (ranks, residuals) for one teleport distribution, given as a
+    vector or as page names / page -> weight dictionary.
+    """
+    if isinstance(teleport, (dict, list, tuple, set)):
+        teleport = graph.teleport_vector(teleport)
+    ranks, residuals = batched_pagerank(graph, [teleport], damping_factor, tolerance)
+    return ranks[0], residuals
+
+
+def iterate_pagerank_sparse(corpus, damping_factor=DAMPING, tolerance=TOLERANCE,
+                            solver="power"):
+    """
+    Return PageRank values for each page of a `crawl` corpus, computed
+    by one of the sparse SOLVERS. Values sum to 1.
+    """
+    graph = LinkGraph.from_corpus(corpus)
+    ranks, _ = SOLVERS[solver](graph, damping_factor, tolerance)
+    return graph.to_dict(ranks)
+
+
+def update_pagerank(corpus, previous, added_pages=(), removed_pages=(),
+                    added_links=(), removed_links=(), damping_factor=DAMPING,
+                    tolerance=TOLERANCE):
+    """
+    Apply changes to a `crawl` corpus and re-rank it, warm-starting from
+    the `previous` ranks of the unchanged corpus.
+
+    Links are (source, target) page pairs; removing a page also removes
+    every link to it, and links to pages outside the corpus are ignored.
+    Small edits only move the ranks a little, so starting from the old
+    ranks instead of the uniform vector converges in far fewer sweeps.
+
+    Returns (corpus, ranks, residuals) with the updated corpus (the
+    input is not modified), its page -> rank dictionary, and the L1
+    residual of each sweep.
+    """
+    corpus = apply_changes(corpus, added_pages, removed_pages, added_links, removed_links)
+    graph = LinkGraph.from_corpus(corpus)
+    ranks, residuals = power_iteration(graph, damping_factor, tolerance,
+                                       start=warm_start(graph, previous))
+    return corpus, graph.to_dict(ranks), residuals
+
+
+def apply_changes(corpus, added_pages=(), removed_pages=(), added_links=(), removed_links=()):
+    """
+    Return a copy of `corpus` with pages and (source, target) links
+    added and removed.
+    """
+    corpus = {page: set(links) for page, links in corpus.items()}
+    for page in added_pages:
+        corpus.setdefault(page, set())
+    for page in removed_pages:
+        corpus.pop(page, None)
+    for source, target in removed_links:
+        if source in corpus:
+            corpus[source].discard(target)
+    for source, target in added_links:
+        if source in corpus and target in corpus and source != target:
+            corpus[source].add(target)
+
+    removed = set(removed_pages)
+    for links in corpus.values():
+        links -= removed
+    return corpus
+
+
+def warm_start(graph, previous):
+    """
+    Return a starting rank vector for `graph` from a previous page ->
+    rank dictionary, giving new pages 1 / n and renormalizing to sum 1.
+    """
+    start = np.array([previous.get(page, 1 / graph.n) for page in graph.pages])
+    return start / start.sum()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rank a corpus by sparse power iteration.")
+    parser.add_argument("corpus", help="directory of HTML pages or a saved link graph")
+    parser.add_argument("--save", metavar="PATH", help="also save the link graph to PATH")
+    parser.add_argument("--personalize", metavar="PAGES", action="append",
+                        help="comma-separated pages to teleport to; repeat to rank "
+                             "several personalizations in one batch")
+    parser.add_argument("--solver", choices=SOLVERS, default="power")
+    parser.add_argument("--residuals", action="store_true",
+                        help="print the L1 residual of every sweep")
+    args = parser.parse_args()
+
+    graph = load_link_graph(args.corpus)
+    if args.save:
+        graph.save(args.save)
+
+    if args.personalize:
+        teleports = [graph.teleport_vector(pages.split(",")) for pages in args.personalize]
+        batch, residuals = batched_pagerank(graph, teleports)
+        for pages, ranks in zip(args.personalize, batch):
+            print(f"Personalized PageRank for {pages} ({len(residuals)} sweeps)")
+            for page, rank in sorted(graph.to_dict(ranks).items()):
+                print(f"  {page}: {rank:.4f}")
+        return
+
+    ranks, residuals = SOLVERS[args.solver](graph)
+    print(f"PageRank Results from Sparse Iteration ({args.solver}, {len(residuals)} sweeps)")
+    for page, rank in sorted(graph.to_dict(ranks).items()):
+        print(f"  {page}: {rank:.4f}")
+    if args.residuals:
+        print("Residuals")
+        for sweep, residual in enumerate(residuals, 1):
+            print(f"  {sweep}: {residual:.3e}")
+
+
+if __name__ == "__main__":
+    main()
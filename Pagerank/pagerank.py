@@ -1,3 +1,4 @@
+import functools
 import os
 import random
 import re
@@ -6,6 +7,9 @@ import sys
 DAMPING = 0.85
 SAMPLES = 10000
 
+# Pages whose transition distributions are kept per corpus
+TRANSITION_CACHE_SIZE = 1 << 16
+
 
 def main():
     if len(sys.argv) != 2:
@@ -48,7 +52,62 @@ def crawl(directory):
     return pages
 
 
-def transition_model(corpus, page, damping_factor):
+class Transitions():
+    """
+    Memoized transition model of one corpus.
+
+    The distribution from a page is stored compactly as its out-links
+    and the probability of each, since every other page only gets the
+    teleport probability shared by all pages. Up to `maxsize` pages are
+    kept, least recently used first out. The corpus must not change
+    while its Transitions are in use.
+    """
+
+    def __init__(self, corpus, damping_factor, maxsize=TRANSITION_CACHE_SIZE):
+        self.corpus = corpus
+        self.damping_factor = damping_factor
+        self.pages = list(corpus)
+        self.teleport = (1 - damping_factor) / len(corpus)
+        self.links = functools.lru_cache(maxsize)(self.compute_links)
+
+    def compute_links(self, page):
+        """
+        Returns (links, probability) for `page`: a tuple of the pages it
+        links to, and the probability of following each one on top of
+        the teleport probability. A page without links counts as linking
+        to every page.
+        """
+        links = tuple(self.corpus[page])
+        if not links:
+            return (), self.damping_factor / len(self.pages)
+        return links, self.damping_factor / len(links)
+
+    def probability(self, page, target):
+        """Returns the probability of going from `page` to `target`."""
+        links, probability = self.links(page)
+        if not links or target in self.corpus[page]:
+            return self.teleport + probability
+        return self.teleport
+
+    def distribution(self, page):
+        """Returns the full page -> probability dictionary for `page`."""
+        links, probability = self.links(page)
+        if not links:
+            return dict.fromkeys(self.pages, self.teleport + probability)
+        probs = dict.fromkeys(self.pages, self.teleport)
+        for link in links:
+            probs[link] += probability
+        return probs
+
+    def step(self, page, rng=random):
+        """Returns the next page of a random surfer on `page`."""
+        links = self.links(page)[0]
+        if links and rng.random() < self.damping_factor:
+            return links[rng.randrange(len(links))]
+        return self.pages[rng.randrange(len(self.pages))]
+
+
+def transition_model(corpus, page, damping_factor, transitions=None):
     """
     Return a probability distribution over which page to visit next,
     given a current page.
@@ -56,27 +115,14 @@ def transition_model(corpus, page, damping_factor):
     With probability `damping_factor`, choose a link at random
     linked to by `page`. With probability `1 - damping_factor`, choose
     a link at random chosen from all pages in the corpus.
-    """
-
-    #Gets starting probabilities to every site and makes a list of the final probability.
-    startingProb = (1-damping_factor) / len(corpus)
-    probs = {}
 
-    #Assigns the starting probability to each site.
-    for site in corpus:
-        probs[site] = startingProb
-
-    #If the page we are on has no links on it, it will distribute the remaining probability to all sites equally.
-    if corpus[page] is None:
-        for site in corpus:
-            probs[site] += damping_factor / len(corpus)
-
-    #Distributes remaining probability equally to all pages that are linked on this site.
-    else:
-        for site in corpus[page]:
-            probs[site] += damping_factor / len(corpus[page])
+    Callers asking about many pages of an unchanging corpus can pass
+    the corpus's `transitions` to reuse its memoized out-links.
+    """
+    if transitions is None:
+        transitions = Transitions(corpus, damping_factor)
+    return transitions.distribution(page)
 
-    return probs
 
 def sample_pagerank(corpus, damping_factor, n):
     """
@@ -87,38 +133,23 @@ def sample_pagerank(corpus, damping_factor, n):
     their estimated PageRank value (a value between 0 and 1). All
     PageRank values should sum to 1.
     """
+    model = Transitions(corpus, damping_factor)
 
-    #Samples will hold all samples and ranks will hold final ranks of pages.
-    samples = []
-    ranks = {}
+    #Counts will hold how often each site was sampled.
+    counts = dict.fromkeys(corpus, 0)
 
-    #A random site will be chosen and added as the first sample
-    sample = random.choice(list(corpus))
-    samples.append(sample)
-
-    #For the other samples, they will be randomly chosen with correct weightings.
+    #A random site will be chosen as the first sample, and every other sample follows the transition model.
+    sample = random.choice(model.pages)
+    counts[sample] += 1
     for i in range(n-1):
-        siteprobs = transition_model(corpus, sample, damping_factor)
-
-        #To assign a range of probability to each site, the first site will be from 0-firstsitechance, second will be firstsitechance-secondsitechance, etc.
-        randomnum = random.random()
-        currentcap = 0
-        for site in siteprobs:
-            currentcap += siteprobs[site]
-            if randomnum < currentcap:
-                sample = site
-                samples.append(sample)
-                break
-
-    #The probability of each site that was a sample will be calculated
-    for site in corpus:
-        ranks[site] = samples.count(site)/n
+        sample = model.step(sample)
+        counts[sample] += 1
 
-    return ranks
+    #The probability of each site is the share of samples it got.
+    return {site: counts[site] / n for site in corpus}
 
 
-
-def iterate_pagerank(corpus, damping_factor):
+def iterate_pagerank(corpus, damping_factor, tolerance=0.001):
     """
     Return PageRank values for each page by iteratively updating
     PageRank values until convergence.
@@ -126,6 +157,10 @@ def iterate_pagerank(corpus, damping_factor):
     Return a dictionary where keys are page names, and values are
     their estimated PageRank value (a value between 0 and 1). All
     PageRank values should sum to 1.
+
+    Every page is updated from the previous sweep's ranks, and iteration
+    stops once no page changed by more than `tolerance` in a whole
+    sweep. matrix.SOLVERS has faster solvers for large corpora.
     """
 
     #This will hold all ranks.
@@ -135,29 +170,29 @@ def iterate_pagerank(corpus, damping_factor):
     for site in corpus:
         ranks[site] = 1 / len(corpus)
 
-    #Keeps track of the maximum change
-    maxchange = 1/len(corpus)
+    #Pages linking to each site, so each update only looks at those.
+    linkers = {site: [] for site in corpus}
+    for linkedsite in corpus:
+        for site in corpus[linkedsite]:
+            linkers[site].append(linkedsite)
 
-    #Keeps adjsuting values until the maximum change that occurs is less than 0.001.
-    while maxchange > 0.001:
+    #A page with no links is treated as linking to every page, itself included.
+    dangling = [site for site in corpus if not corpus[site]]
+
+    #Keeps adjusting values until the maximum change over all sites is at most the tolerance.
+    while True:
+        spread = damping_factor * sum(ranks[site] for site in dangling) / len(corpus)
+        newranks = {}
         for site in corpus:
-            rest = 0
-            maxchange = 0
 
             #rest variable is what I used to do the second part of the equation in the background part of the project desc.
-            for linkedsite in corpus:
-                if site in corpus[linkedsite]:
-                    rest += ranks[linkedsite]/len(corpus[linkedsite])
-            rest *= damping_factor
-
-            #The new score is adjusted based on the equation.
-            newscore = (1-damping_factor)/len(corpus) + rest
-            change = abs(newscore - ranks[site])
-            if change > maxchange:
-                maxchange = abs(newscore - ranks[site])
-            ranks[site] = newscore
-
-    return ranks
+            rest = sum(ranks[linkedsite] / len(corpus[linkedsite]) for linkedsite in linkers[site])
+            newranks[site] = (1-damping_factor)/len(corpus) + spread + damping_factor * rest
+
+        maxchange = max(abs(newranks[site] - ranks[site]) for site in corpus)
+        ranks = newranks
+        if maxchange <= tolerance:
+            return ranks
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,196 @@
+import argparse
+import multiprocessing
+import time
+from statistics import NormalDist
+
+import numpy as np
+
+from matrix import LinkGraph, load_link_graph
+from pagerank import DAMPING, SAMPLES
+
+# Most random surfers advanced together in each vectorized step
+WALKERS = 1024
+
+# Steps each surfer takes, in mean walks between teleports 1 / (1 - d):
+# walks start on uniformly random pages, and counting only a few steps of
+# each pulls the estimate towards uniform
+MIXING = 20
+
+# Independent sampling batches in parallel runs; their spread gives the
+# confidence intervals, and results depend only on this and the seed
+BATCHES = 16
+
+# Graph sampled by pool workers, set once per worker by init_worker
+worker_graph = None
+
+
+def sample_counts(graph, damping_factor, n, walkers=WALKERS, rng=None):
+    """
+    Return an array of visit counts per page from `n` samples of the
+    random surfer on `graph`.
+
+    Up to `walkers` surfers start on uniformly random pages and are
+    advanced in lockstep, one NumPy step for all of them, until `n` pages
+    have been visited in total. Fewer surfers are used when `n` is too
+    small for each to take walk_steps(damping_factor) steps. Choosing a
+    link is O(1) per step: the CSR out-links of a page are a contiguous
+    slice, so a uniform link is
+    `indices[indptr[page] + floor(u * out_degree[page])]`.
+    """
+    counts = np.zeros(graph.n, dtype=np.int64)
+    if n <= 0:
+        return counts
+    rng = rng if rng is not None else np.random.default_rng()
+    walkers = max(1, min(walkers, n // walk_steps(damping_factor)))
+
+    current = rng.integers(0, graph.n, walkers)
+    counts += np.bincount(current, minlength=graph.n)
+    remaining = n - walkers
+
+    while remaining > 0:
+
+        # Teleport with probability 1 - damping, or always from a page
+        # without links; otherwise follow one of the page's links
+        degree = graph.out_degree[current]
+        follow = (rng.random(walkers) < damping_factor) & (degree > 0)
+        following = current[follow]
+        pick = (rng.random(len(following)) * degree[follow]).astype(np.int64)
+        current = rng.integers(0, graph.n, walkers)
+        current[follow] = graph.indices[graph.indptr[following] + pick]
+
+        # The last step may need fewer samples than there are walkers
+        taken = current[:remaining]
+        counts += np.bincount(taken, minlength=graph.n)
+        remaining -= len(taken)
+
+    return counts
+
+
+def walk_steps(damping_factor):
+    """
+    Return the fewest steps each surfer should take: MIXING times the
+    mean number of steps between teleports.
+    """
+    return int(np.ceil(MIXING / max(1 - damping_factor, 1 / MIXING)))
+
+
+def sample_pagerank_fast(corpus, damping_factor=DAMPING, n=SAMPLES, seed=None):
+    """
+    Return PageRank values for each page of a `crawl` corpus estimated
+    from `n` vectorized random-surfer samples. Values sum to 1.
+    """
+    if n < 1:
+        raise ValueError("need at least one sample")
+    graph = LinkGraph.from_corpus(corpus)
+    counts = sample_counts(graph, damping_factor, n, rng=np.random.default_rng(seed))
+    return graph.to_dict(counts / n)
+
+
+def parallel_sample_counts(graph, damping_factor, n, processes=None,
+                           batches=BATCHES, seed=None):
+    """
+    Return a (batches x pages) array of visit counts, sampling `n`
+    pages in total split across `batches` independent batches run on a
+    pool of `processes` workers. Fewer batches are run when `n` is too
+    small for each to take walk_steps(damping_factor) samples, and a
+    ValueError is raised if even one batch cannot.
+
+    Each batch draws from its own generator spawned from
+    SeedSequence(seed), so for a given seed and number of batches the
+    result is the same however many processes run them. A graph loaded
+    from disk is memory-mapped again by each worker rather than copied.
+    """
+    steps = walk_steps(damping_factor)
+    if n < steps:
+        raise ValueError(f"need at least {steps} samples for the walks to mix")
+    batches = min(batches, n // steps)
+    seeds = np.random.SeedSequence(seed).spawn(batches)
+    shares = [n // batches + (i < n % batches) for i in range(batches)]
+    jobs = [(damping_factor, share, child) for share, child in zip(shares, seeds)]
+    source = graph if graph.path is None else graph.path
+
+    with multiprocessing.Pool(processes, initializer=init_worker, initargs=(source,)) as pool:
+        return np.array(pool.map(sample_batch, jobs))
+
+
+def init_worker(source):
+    """
+    Pool initializer: keeps the graph for this worker's batches, mapping
+    it from disk if `source` is the path of a saved graph.
+    """
+    global worker_graph
+    worker_graph = LinkGraph.load(source) if isinstance(source, str) else source
+
+
+def sample_batch(job):
+    """Pool task: returns the visit counts of one seeded batch."""
+    damping_factor, n, seed = job
+    return sample_counts(worker_graph, damping_factor, n, rng=np.random.default_rng(seed))
+
+
+def parallel_sample_pagerank(corpus, damping_factor=DAMPING, n=SAMPLES, processes=None,
+                             batches=BATCHES, seed=None, confidence=0.95):
+    """
+    Return {page: (rank, half_width)} for a `crawl` corpus, sampled in
+    parallel batches by parallel_sample_ranks.
+    """
+    graph = LinkGraph.from_corpus(corpus)
+    ranks, half_widths = parallel_sample_ranks(graph, damping_factor, n, processes,
+                                               batches, seed, confidence)
+    return {
+        page: (float(rank), float(half_width))
+        for page, rank, half_width in zip(graph.pages, ranks, half_widths)
+    }
+
+
+def parallel_sample_ranks(graph, damping_factor=DAMPING, n=SAMPLES, processes=None,
+                          batches=BATCHES, seed=None, confidence=0.95):
+    """
+    Return (ranks, half_widths) arrays for `graph`, sampled in parallel
+    batches.
+
+    Samples along one surfer's walk are correlated, but batches are
+    independent, so the interval comes from the spread of the batch
+    estimates at the given `confidence`. It covers sampling noise only:
+    walks start on uniformly random pages, which adds a small bias that
+    shrinks as each walker takes more steps (see sample_counts).
+    """
+    counts = parallel_sample_counts(graph, damping_factor, n, processes, batches, seed)
+    ranks = counts.sum(axis=0) / counts.sum()
+    if len(counts) < 2:
+        # One batch has no spread to estimate an interval from
+        return ranks, np.full(graph.n, np.inf)
+    estimates = counts / counts.sum(axis=1, keepdims=True)
+    z = NormalDist().inv_cdf((1 + confidence) / 2)
+    half_widths = z * estimates.std(axis=0, ddof=1) / np.sqrt(len(counts))
+    return ranks, half_widths
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Estimate PageRank by vectorized sampling.")
+    parser.add_argument("corpus", help="directory of HTML pages or a saved link graph")
+    parser.add_argument("samples", nargs="?", type=int, default=SAMPLES)
+    parser.add_argument("--processes", type=int,
+                        help="sample in parallel batches on this many processes")
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+    graph = load_link_graph(args.corpus)
+
+    start = time.perf_counter()
+    if args.processes:
+        ranks, half_widths = parallel_sample_ranks(graph, DAMPING, args.samples,
+                                                   args.processes, seed=args.seed)
+    else:
+        counts = sample_counts(graph, DAMPING, args.samples,
+                               rng=np.random.default_rng(args.seed))
+        ranks, half_widths = counts / args.samples, None
+    elapsed = time.perf_counter() - start
+
+    print(f"PageRank Results from Vectorized Sampling (n = {args.samples}, {elapsed:.3f}s)")
+    for i in sorted(range(graph.n), key=graph.pages.__getitem__):
+        interval = "" if half_widths is None else f" ± {half_widths[i]:.4f}"
+        print(f"  {graph.pages[i]}: {ranks[i]:.4f}{interval}")
+
+
+if __name__ == "__main__":
+    main()